@@ -0,0 +1,77 @@
+"""
+Benchmark /fch chart rendering: old Command.generate_chart (python loop conversion, per-row tz_convert,
+styles rebuilt per call, dpi=300) vs ChartEngine, conversion and full render are timed separately.
+
+Usage: python -m benchmarks.chart_render [dpi]
+"""
+import io
+import sys
+import time
+import timeit
+
+import pandas as pd
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import mplfinance as mpf
+
+from command_trade.chart import ChartEngine
+
+def to_dataframe_old(data: list) -> pd.DataFrame:
+    for line in data:
+        del line[6:]
+        for i in range(1, len(line)):
+            line[i] = float(line[i])
+    df = pd.DataFrame(data, columns=['date', 'open', 'high', 'low', 'close', 'volume'])
+    df['date'] = pd.to_datetime(df['date'], unit='ms', utc=True).map(lambda x: x.tz_convert('Asia/Ho_Chi_Minh'))
+    df.set_index('date', inplace=True)
+    return df
+
+def render_old(data: list) -> io.BytesIO:
+    df = to_dataframe_old(data)
+    mc = mpf.make_marketcolors(up='#2fc71e',down='#ed2f1a',inherit=True)
+    s  = mpf.make_mpf_style(base_mpl_style=['bmh', 'dark_background'], marketcolors=mc, y_on_right=True)
+    buffer = io.BytesIO()
+    fig, axlist = mpf.plot(df, figratio=(10, 6), type="candle", tight_layout=True, ylabel = "Precio ($)", returnfig=True, volume=True, style=s)
+    axlist[0].set_title("FUTURES - BTCUSDT - 15m", fontsize=25, style='italic')
+    fig.savefig(fname=buffer, dpi=300, bbox_inches="tight")
+    plt.close(fig) # not closed in the old code, closed here to not skew later runs
+    buffer.seek(0)
+    return buffer
+
+def synthetic_klines(n: int) -> list:
+    # same shape as futures_historical_klines: [open_time, "open", "high", "low", "close", "volume", close_time, ...]
+    start = 1700000000000
+    klines = []
+    price = 100.0
+    for i in range(n):
+        open_time = start + i * 15 * 60 * 1000
+        close = price * (1 + ((i * 7919) % 200 - 100) / 10000)
+        klines.append([open_time, f"{price:.4f}", f"{max(price, close) * 1.002:.4f}", f"{min(price, close) * 0.998:.4f}", f"{close:.4f}",
+                       f"{1000 + i % 50:.3f}", open_time + 15 * 60 * 1000 - 1, "0", 100, "0", "0", "0"])
+        price = close
+    return klines
+
+def best(func, number: int) -> float:
+    return min(timeit.repeat(func, number=number, repeat=3)) / number
+
+def main():
+    dpi = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    engine = ChartEngine(dpi=dpi)
+    for n in (100, 1000, 10000):
+        klines = synthetic_klines(n)
+        assert to_dataframe_old([list(k) for k in klines]).equals(engine.to_dataframe(klines))
+        old = best(lambda: to_dataframe_old([list(k) for k in klines]), 5)
+        copy = best(lambda: [list(k) for k in klines], 5) # old conversion mutates its input
+        new = best(lambda: engine.to_dataframe(klines), 5)
+        print(f"{n} candles conversion: old {(old - copy) * 1000:.2f}ms, new {new * 1000:.2f}ms")
+        start = time.perf_counter()
+        render_old([list(k) for k in klines])
+        old = time.perf_counter() - start
+        start = time.perf_counter()
+        size = len(engine.render("FUTURES - BTCUSDT - 15m", klines).getvalue())
+        new = time.perf_counter() - start
+        print(f"{n} candles render: old {old * 1000:.0f}ms, new (dpi={dpi}) {new * 1000:.0f}ms, {size // 1024}KB")
+
+if __name__ == "__main__":
+    main()
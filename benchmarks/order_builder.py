@@ -0,0 +1,121 @@
+"""
+Benchmark /forder command-to-submit latency: old path (get_position_info + f_price rest reads, round() to quantityPrecision)
+vs OrderBuilder (cached symbol config, rules and price). Rest calls are simulated with a fixed round-trip time,
+the batch submission itself is not included.
+
+Usage: python -m benchmarks.order_builder [rtt_ms]
+"""
+import asyncio
+import sys
+import time
+import timeit
+import types
+from decimal import Decimal
+
+from command_trade.binance_api import BinanceAPI, BinanceCache
+from command_trade.command import Command
+from command_trade.order_builder import OrderBuilder, SymbolRules
+
+SYMBOLS = {
+    # symbol: (stepSize, minQty, tickSize, quantityPrecision, pricePrecision, price)
+    "BTCUSDT": ("0.001", "0.001", "0.10", 3, 2, "64321.37"),
+    "DOGEUSDT": ("1", "1", "0.000010", 0, 6, "0.123456"),
+    "1000PEPEUSDT": ("1", "1", "0.0000001", 0, 7, "0.0112345"),
+    "XRPUSDT": ("0.1", "0.1", "0.0001", 1, 4, "0.5312"),
+}
+
+def exchange_info(symbol: str) -> dict:
+    step, min_qty, tick, quantity_precision, price_precision, _ = SYMBOLS[symbol]
+    return {
+        "symbol": symbol,
+        "quantityPrecision": quantity_precision,
+        "pricePrecision": price_precision,
+        "filters": [
+            {"filterType": "PRICE_FILTER", "tickSize": tick},
+            {"filterType": "LOT_SIZE", "stepSize": step, "minQty": min_qty, "maxQty": "1000000000"},
+            {"filterType": "MARKET_LOT_SIZE", "stepSize": step, "minQty": min_qty, "maxQty": "1000000000"},
+            {"filterType": "MIN_NOTIONAL", "notional": "5"},
+        ]
+    }
+
+class FakeClient:
+    def __init__(self, rtt: float):
+        self.rtt = rtt
+    def futures_position_information(self, symbol: str, **params):
+        time.sleep(self.rtt)
+        return [{"symbol": symbol, "leverage": "10", "marginType": "cross"}]
+    def futures_symbol_ticker(self, symbol: str):
+        time.sleep(self.rtt)
+        return {"price": SYMBOLS[symbol][5]}
+    def futures_symbol_config(self, symbol: str):
+        time.sleep(self.rtt)
+        return [{"symbol": symbol, "leverage": 10, "marginType": "CROSSED"}]
+
+def build_binance_api(rtt: float) -> BinanceAPI:
+    binance_api = BinanceAPI.__new__(BinanceAPI) # skip client and exchange info thread
+    binance_api.config = types.SimpleNamespace(BINANCE_TICKER_TTL=2, BINANCE_EXCHANGE_INFO_MIN_REFRESH=60)
+    binance_api.binance_client = FakeClient(rtt)
+    binance_api.cache = BinanceCache()
+    binance_api.executor = None
+    binance_api.tickers = {symbol: {"symbol": symbol, "lastPrice": value[5]} for symbol, value in SYMBOLS.items()}
+    binance_api.tickers_refreshed_at = time.time() + 3600 # snapshot stays fresh during the benchmark
+    with binance_api.cache.open_symbols() as symbols:
+        for symbol in SYMBOLS:
+            symbols[symbol] = exchange_info(symbol)
+    return binance_api
+
+async def old_path(binance_api: BinanceAPI, symbol: str, leverage: int, margin: float, args: list[str]) -> list[dict]:
+    position_info = (await binance_api.run(binance_api.get_position_info, symbol))[0]
+    if int(position_info["leverage"]) != leverage or position_info["marginType"] != "cross":
+        raise RuntimeError("benchmark expects no leverage/margin change")
+    price = await binance_api.run(binance_api.f_price, symbol)
+    pair_info = await binance_api.run(binance_api.f_get_symbol_info, symbol)
+    quantity_precision = int(pair_info['quantityPrecision']) if pair_info else 3
+    quantity = round(margin * leverage / price, quantity_precision)
+    batch_orders = [{"type": "MARKET", "side": "BUY", "symbol": symbol, "quantity": str(quantity)}]
+    if len(args) > 4:
+        batch_orders.append({"type": "STOP_MARKET", "side": "SELL", "symbol": symbol, "stopPrice": args[4], "closePosition": "true"})
+    if len(args) > 5:
+        batch_orders.append({"type": "TAKE_PROFIT_MARKET", "side": "SELL", "symbol": symbol, "stopPrice": args[5], "closePosition": "true"})
+    return batch_orders
+
+async def new_path(command: Command, symbol: str, leverage: int, margin: float, args: list[str]) -> list[dict]:
+    # same order as Command.forder: the order is only built once margin type and leverage are applied
+    await command.f_set_leverage_and_margin_type(symbol, leverage)
+    return await command.f_get_orders("buy", symbol, leverage, margin, types.SimpleNamespace(args=args))
+
+def is_valid(order: dict) -> bool:
+    if order["type"] != "MARKET":
+        return True
+    step, min_qty = Decimal(SYMBOLS[order["symbol"]][0]), Decimal(SYMBOLS[order["symbol"]][1])
+    quantity = Decimal(order["quantity"])
+    return quantity >= min_qty and quantity % step == 0 and quantity * Decimal(SYMBOLS[order["symbol"]][5]) >= 5
+
+async def main():
+    rtt = (float(sys.argv[1]) if len(sys.argv) > 1 else 50) / 1000
+    binance_api = build_binance_api(rtt)
+    command = Command.__new__(Command) # only the order entry helpers are used
+    command.binance_api = binance_api
+    command.price_stream = types.SimpleNamespace(get_fresh_ticker=lambda symbol: None)
+    command.order_builder = OrderBuilder(binance_api, command.price_stream)
+    await command.f_set_leverage_and_margin_type("BTCUSDT", 10) # first order of a symbol fills the config cache
+    for symbol in SYMBOLS:
+        binance_api.update_symbol_config(symbol, leverage=10, margin_type="CROSSED")
+    for symbol in SYMBOLS:
+        args = ["buy", symbol, "10", "7.3", "1", "2"]
+        runs = 10
+        start = time.perf_counter()
+        for _ in range(runs):
+            old_orders = await old_path(binance_api, symbol, 10, 7.3, args)
+        old = (time.perf_counter() - start) / runs
+        start = time.perf_counter()
+        for _ in range(runs):
+            new_orders = await new_path(command, symbol, 10, 7.3, args)
+        new = (time.perf_counter() - start) / runs
+        rules = SymbolRules(exchange_info(symbol))
+        build = min(timeit.repeat(lambda: command.order_builder.market_orders(rules, "BUY", 10, 7.3, Decimal(SYMBOLS[symbol][5]), "1", "2"), number=1000, repeat=3)) / 1000
+        print(f"{symbol}: old {old * 1000:.1f}ms qty={old_orders[0]['quantity']} valid={is_valid(old_orders[0])}, "
+              f"new {new * 1000:.3f}ms qty={new_orders[0]['quantity']} valid={is_valid(new_orders[0])}, build {build * 1e6:.1f}us")
+
+if __name__ == "__main__":
+    asyncio.run(main())
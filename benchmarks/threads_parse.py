@@ -0,0 +1,97 @@
+"""
+Benchmark Threads page parsing: old path (json.loads + nested_lookup + jmespath.search per reply)
+vs Threads.parse_html (find_thread_items + extract_thread), both must return the same result.
+
+Usage: python -m benchmarks.threads_parse [recorded_page.html ...]
+The old path needs jmespath, which the bot itself no longer uses: pip install jmespath==1.0.1
+Without arguments, synthetic pages with 50/500/2000 replies are used.
+"""
+import json
+import sys
+import timeit
+
+import jmespath
+from nested_lookup import nested_lookup
+from parsel import Selector
+
+from command_trade.threads import Threads
+
+THREAD_EXPRESSION = jmespath.compile(
+    """{
+    text: post.caption.text,
+    published_on: post.taken_at,
+    id: post.id,
+    pk: post.pk,
+    code: post.code,
+    username: post.user.username,
+    user_pic: post.user.profile_pic_url,
+    user_verified: post.user.is_verified,
+    user_pk: post.user.pk,
+    user_id: post.user.id,
+    has_audio: post.has_audio,
+    reply_count: view_replies_cta_string,
+    like_count: post.like_count,
+    images: post.image_versions2.candidates[0].url,
+    image_count: post.carousel_media_count,
+    videos: post.video_versions[].url
+}"""
+)
+
+def parse_html_old(threads: Threads, html: str) -> dict:
+    selector = Selector(html)
+    for hidden_dataset in selector.css('script[type="application/json"][data-sjs]::text').getall():
+        if '"ScheduledServerJS"' not in hidden_dataset or "thread_items" not in hidden_dataset:
+            continue
+        thread_items = nested_lookup("thread_items", json.loads(hidden_dataset))
+        if not thread_items:
+            continue
+        threads_parsed = []
+        for thread in thread_items:
+            for t in thread:
+                result = THREAD_EXPRESSION.search(t)
+                result["videos"] = list(set(result["videos"] or []))
+                if result["reply_count"] and type(result["reply_count"]) != int:
+                    result["reply_count"] = int(result["reply_count"].split(" ")[0])
+                result["url"] = f"{threads.BASE_URL}/@{result['username']}/post/{result['code']}"
+                threads_parsed.append(result)
+        return {"thread": threads_parsed[0], "replies": threads_parsed[1:]}
+    return {}
+
+def synthetic_page(replies: int) -> str:
+    def post(i: int):
+        return {
+            "post": {
+                "caption": {"text": f"reply {i} " * 10},
+                "taken_at": 1700000000 + i,
+                "id": f"{i}_1",
+                "pk": str(1000 + i),
+                "code": f"C{i}",
+                "user": {"username": f"user{i % 7}", "profile_pic_url": "https://example.com/p.jpg", "is_verified": False, "pk": "9", "id": "9"},
+                "has_audio": None,
+                "like_count": i,
+                "image_versions2": {"candidates": [{"url": f"https://example.com/{i}.jpg"}]},
+                "carousel_media_count": None,
+                "video_versions": []
+            },
+            "view_replies_cta_string": "3 replies",
+            # unrelated nested data, as in real pages
+            "extra": {"a": [{"b": {"c": list(range(20))}} for _ in range(5)]}
+        }
+    edges = [{"node": {"thread_items": [post(i)]}} for i in range(replies + 1)]
+    payload = {"require": [["ScheduledServerJS", "handle", None, [{"__bbox": {"result": {"data": {"edges": edges}}}}]]]}
+    return f'<html><head><script type="application/json" data-sjs>{json.dumps(payload)}</script></head><body></body></html>'
+
+def main():
+    threads = Threads.__new__(Threads) # skip playwright install in __init__
+    pages = [(path, open(path, encoding="utf-8").read()) for path in sys.argv[1:]]
+    if len(pages) == 0:
+        pages = [(f"synthetic {n} replies", synthetic_page(n)) for n in (50, 500, 2000)]
+    for name, html in pages:
+        assert parse_html_old(threads, html) == threads.parse_html(html)
+        number = 20
+        old = min(timeit.repeat(lambda: parse_html_old(threads, html), number=number, repeat=3)) / number
+        new = min(timeit.repeat(lambda: threads.parse_html(html), number=number, repeat=3)) / number
+        print(f"{name}: old {old * 1000:.2f}ms, new {new * 1000:.2f}ms, speedup x{old / new:.2f}")
+
+if __name__ == "__main__":
+    main()
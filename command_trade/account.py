@@ -0,0 +1,215 @@
+import asyncio
+import time
+from typing import Dict, Tuple
+
+from .logger import Logger
+from .config import Config
+from .binance_api import BinanceAPI
+from .stream import PriceStream, UserDataStream
+
+OPEN_ORDER_STATUS = ["NEW", "PARTIALLY_FILLED"]
+
+def format_number(value: float) -> str: # same look as numbers of rest api, ex: 12.34500000 -> 12.345
+    return f"{value:.8f}".rstrip("0").rstrip(".")
+
+class AccountMirror:
+    """
+    In-memory futures account: wallet, positions, open orders and leverage, kept up to date by user data stream events.
+    Derived fields (notional, pnl, margins) are computed on read from mark prices of the price stream, with the same field names
+    as rest api futures_account/futures_position_information. Rest api is only used to resync: at first read, after a reconnection
+    of the user data stream, after an event the mirror can't apply, or when the mirror is older than BINANCE_ACCOUNT_RESYNC.
+    """
+    def __init__(self, config: Config, logger: Logger, binance_api: BinanceAPI, price_stream: PriceStream, user_stream: UserDataStream):
+        self.config = config
+        self.logger = logger
+        self.binance_api = binance_api
+        self.price_stream = price_stream
+        self.user_stream = user_stream
+        self.wallet_balance = 0.0 # totalWalletBalance
+        self.usdt_wallet = 0.0 # part of wallet updated by ACCOUNT_UPDATE
+        self.positions: Dict[Tuple[str, str], dict] = {} # (symbol, positionSide) -> position
+        self.orders: Dict[int, dict] = {} # orderId -> open order
+        self.leverages: Dict[str, int] = {}
+        self.margin_types: Dict[str, str] = {} # symbol -> isolated/cross
+        self.synced_at = 0.0
+        self.synced_connections = -1 # user stream connection the mirror is synced with
+        self.dirty = True
+        self.resync_lock = asyncio.Lock()
+        self.buffered: list[dict] | None = None # events received while a resync reads rest api
+        user_stream.add_listener(self.on_event)
+
+    def is_fresh(self) -> bool:
+        if not self.config.BINANCE_USER_STREAM_ENABLED or not self.user_stream.is_alive():
+            return False
+        if self.dirty or self.synced_connections != self.user_stream.connections:
+            return False
+        if time.time() - self.synced_at > self.config.BINANCE_ACCOUNT_RESYNC:
+            return False
+        # without price stream, mark prices are only as fresh as the last resync
+        return len(self.positions) == 0 or self.price_stream.is_alive()
+
+    async def resync(self):
+        async with self.resync_lock:
+            if self.is_fresh(): # already resynced by a concurrent caller
+                return
+            connections = self.user_stream.connections
+            self.buffered = []
+            try:
+                account_info, positions, orders = await asyncio.gather(
+                    self.binance_api.run(self.binance_api.get_futures_account),
+                    self.binance_api.run(self.binance_api.get_current_position),
+                    self.binance_api.run(self.binance_api.f_open_orders)
+                )
+            finally: # cancelled or failed: state is untouched and still not fresh
+                buffered, self.buffered = self.buffered, None
+            self.wallet_balance = float(account_info["totalWalletBalance"])
+            self.usdt_wallet = next((float(asset["walletBalance"]) for asset in account_info.get("assets", []) if asset["asset"] == "USDT"), 0.0)
+            for position in account_info.get("positions", []):
+                if "leverage" in position:
+                    self.leverages[position["symbol"]] = int(position["leverage"])
+                if "isolated" in position:
+                    self.margin_types[position["symbol"]] = "isolated" if position["isolated"] else "cross"
+                if "leverage" in position and "isolated" in position:
+                    self.binance_api.update_symbol_config(position["symbol"], leverage=int(position["leverage"]), margin_type=self.margin_types[position["symbol"]])
+            self.positions = {}
+            for position in positions:
+                if float(position["positionAmt"]) != 0:
+                    self.positions[(position["symbol"], position.get("positionSide", "BOTH"))] = {
+                        "symbol": position["symbol"],
+                        "positionSide": position.get("positionSide", "BOTH"),
+                        "positionAmt": position["positionAmt"],
+                        "entryPrice": position["entryPrice"],
+                        "markPrice": position["markPrice"]
+                    }
+                if position["symbol"] not in self.leverages and float(position.get("positionInitialMargin", 0)) > 0:
+                    self.leverages[position["symbol"]] = abs(round(float(position["notional"]) / float(position["positionInitialMargin"])))
+            self.orders = {order["orderId"]: order for order in orders}
+            self.dirty = False
+            # events may be older or newer than the snapshot, they set absolute values so replaying them in order is safe
+            for event in buffered:
+                self.apply_event(event)
+            self.synced_at = time.time()
+            self.synced_connections = connections
+
+    async def on_event(self, event: dict): # listener of user data stream
+        if self.buffered is not None:
+            self.buffered.append(event)
+        self.apply_event(event)
+
+    def apply_event(self, event: dict):
+        event_type = event.get("e")
+        if event_type == "ACCOUNT_UPDATE":
+            for balance in event["a"].get("B", []):
+                if balance["a"] == "USDT":
+                    self.wallet_balance += float(balance["wb"]) - self.usdt_wallet
+                    self.usdt_wallet = float(balance["wb"])
+                else: # value of other assets in usd is only known by rest api
+                    self.dirty = True
+            for update in event["a"].get("P", []):
+                key = (update["s"], update.get("ps", "BOTH"))
+                self.margin_types[update["s"]] = update["mt"]
+                self.binance_api.update_symbol_config(update["s"], margin_type=update["mt"])
+                if float(update["pa"]) == 0:
+                    self.positions.pop(key, None)
+                    continue
+                position = self.positions.setdefault(key, {"symbol": update["s"], "positionSide": key[1], "markPrice": update["ep"]})
+                position["positionAmt"] = update["pa"]
+                position["entryPrice"] = update["ep"]
+        elif event_type == "ORDER_TRADE_UPDATE":
+            update = event["o"]
+            if update["X"] in OPEN_ORDER_STATUS:
+                self.orders[update["i"]] = {
+                    "orderId": update["i"],
+                    "symbol": update["s"],
+                    "side": update["S"],
+                    "type": update["o"],
+                    "origQty": update["q"],
+                    "executedQty": update["z"],
+                    "price": update["p"],
+                    "stopPrice": update["sp"],
+                    "reduceOnly": update.get("R", False),
+                    "closePosition": update.get("cp", False),
+                    "status": update["X"]
+                }
+            else:
+                self.orders.pop(update["i"], None)
+        elif event_type == "ACCOUNT_CONFIG_UPDATE":
+            if "ac" in event:
+                self.leverages[event["ac"]["s"]] = int(event["ac"]["l"])
+                self.binance_api.update_symbol_config(event["ac"]["s"], leverage=int(event["ac"]["l"]))
+            else: # multi-assets mode changed
+                self.dirty = True
+        elif event_type == "listenKeyExpired":
+            self.dirty = True
+
+    def get_leverage(self, symbol: str) -> int | None:
+        return self.leverages.get(symbol)
+
+    def get_margin_type(self, symbol: str) -> str | None:
+        return self.margin_types.get(symbol)
+
+    def open_order_margin(self, symbol: str, leverage: int) -> float:
+        margin = 0.0
+        for order in self.orders.values():
+            if order["symbol"] != symbol or order["reduceOnly"] or order["closePosition"] or float(order["price"]) == 0:
+                continue
+            margin += (float(order["origQty"]) - float(order["executedQty"])) * float(order["price"]) / leverage
+        return margin
+
+    def build_position(self, symbol: str, position: dict | None) -> dict:
+        leverage = self.leverages.get(symbol) or 1
+        amount = float(position["positionAmt"]) if position else 0.0
+        entry_price = float(position["entryPrice"]) if position else 0.0
+        mark_price = self.price_stream.get_mark_price(symbol)
+        if mark_price is None:
+            mark_price = float(position["markPrice"]) if position else 0.0
+        notional = amount * mark_price
+        return {
+            "symbol": symbol,
+            "positionSide": position["positionSide"] if position else "BOTH",
+            "positionAmt": position["positionAmt"] if position else "0",
+            "entryPrice": position["entryPrice"] if position else "0",
+            "markPrice": format_number(mark_price),
+            "unRealizedProfit": format_number(amount * (mark_price - entry_price)),
+            "notional": format_number(notional),
+            "positionInitialMargin": format_number(abs(notional) / leverage),
+            "openOrderInitialMargin": format_number(self.open_order_margin(symbol, leverage)),
+            "leverage": str(leverage)
+        }
+
+    async def get_positions(self, symbol: str | None = None) -> list[dict]:
+        """
+        Same as rest api futures_position_information: positions and symbols with open orders
+        """
+        if not self.is_fresh():
+            await self.resync()
+        result = []
+        symbols_with_position = set()
+        for (position_symbol, _), position in list(self.positions.items()):
+            if symbol is None or position_symbol == symbol:
+                symbols_with_position.add(position_symbol)
+                result.append(self.build_position(position_symbol, position))
+        for order_symbol in sorted({order["symbol"] for order in self.orders.values()} - symbols_with_position):
+            if symbol is None or order_symbol == symbol:
+                result.append(self.build_position(order_symbol, None))
+        return result
+
+    async def get_account(self) -> Tuple[dict, list[dict]]:
+        """
+        Wallet totals (fields of rest api futures_account) and positions
+        """
+        positions = await self.get_positions()
+        unrealized_profit = sum(float(position["unRealizedProfit"]) for position in positions)
+        position_margin = sum(float(position["positionInitialMargin"]) for position in positions)
+        open_margin = sum(float(position["openOrderInitialMargin"]) for position in positions)
+        margin_balance = self.wallet_balance + unrealized_profit
+        account_info = {
+            "totalWalletBalance": format_number(self.wallet_balance),
+            "totalUnrealizedProfit": format_number(unrealized_profit),
+            "totalMarginBalance": format_number(margin_balance),
+            "totalPositionInitialMargin": format_number(position_margin),
+            "totalOpenOrderInitialMargin": format_number(open_margin),
+            "totalInitialMargin": format_number(position_margin + open_margin),
+            "availableBalance": format_number(max(0.0, margin_balance - position_margin - open_margin))
+        }
+        return account_info, positions
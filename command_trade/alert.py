@@ -0,0 +1,98 @@
+from bisect import bisect_left, insort
+
+THRESHOLD_TOLERANCE = 1e-9 # relative, far above float rounding of threshold/equal
+
+class PriceAlert:
+    def __init__(self, op: str, price: float, gap: float = 0.5):
+        self.op = op
+        self.price = price
+        self.gap = gap
+    def __str__(self):
+        return self.op + " " + str(self.price) + f" ({self.gap}%)"
+    def equal(self, price: float):
+        if (abs(self.price - price) / self.price) <= self.gap / 100.0: # check around gap%
+            return True
+        if self.op == '<':
+            return price <= self.price
+        else:
+            return price >= self.price
+    def threshold(self) -> float:
+        """
+        '<' alert is triggered when price <= price * (1 + gap%), '>' alert when price >= price * (1 - gap%)
+        """
+        if self.op == '<':
+            return self.price * (1 + self.gap / 100.0)
+        return self.price * (1 - self.gap / 100.0)
+
+class AlertBook:
+    """
+    All alerts of one symbol. Alerts are kept in insertion order (index for falert_list/falert_remove)
+    and in 2 sorted arrays of (key, seq) so that triggered alerts are always a suffix:
+    - '<' alerts, key = threshold, triggered when key >= price
+    - '>' alerts, key = -threshold, triggered when key >= -price
+    """
+    def __init__(self):
+        self.alerts: dict[int, PriceAlert] = {} # seq -> alert, dict keeps insertion order
+        self.lower: list[tuple[float, int]] = []
+        self.upper: list[tuple[float, int]] = []
+        self.next_seq = 0
+
+    def __len__(self):
+        return len(self.alerts)
+
+    def __iter__(self):
+        return iter(self.alerts.values())
+
+    def items(self): # (seq, alert) in insertion order
+        return self.alerts.items()
+
+    def key(self, alert: PriceAlert):
+        if alert.op == '<':
+            return self.lower, alert.threshold()
+        return self.upper, -alert.threshold()
+
+    def add(self, alert: PriceAlert, seq: int | None = None) -> int:
+        if seq is None:
+            seq = self.next_seq
+        self.next_seq = max(self.next_seq, seq + 1)
+        self.alerts[seq] = alert
+        array, key = self.key(alert)
+        insort(array, (key, seq))
+        return seq
+
+    def remove(self, seq: int) -> PriceAlert:
+        alert = self.alerts.pop(seq)
+        array, key = self.key(alert)
+        array.pop(bisect_left(array, (key, seq)))
+        return alert
+
+    def remove_indices(self, list_idx: list[int]) -> list[int]: # index in insertion order, return seqs removed
+        list_seq = list(self.alerts)
+        removed = [list_seq[idx] for idx in sorted(set(list_idx), reverse=True)]
+        for seq in removed:
+            self.remove(seq)
+        return removed
+
+    def clear(self):
+        self.alerts.clear()
+        self.lower.clear()
+        self.upper.clear()
+
+    def pop_triggered(self, price: float) -> list[tuple[int, PriceAlert]]:
+        """
+        Remove and return all alerts triggered by price in O(log n + k), (seq, alert) sorted by insertion order.
+        Same result as PriceAlert.equal on every alert: the suffix is widened by a relative tolerance,
+        so alerts whose threshold rounds differently than equal are checked one by one.
+        """
+        triggered = []
+        for array, key in ((self.lower, price), (self.upper, -price)):
+            idx = bisect_left(array, (key - abs(key) * THRESHOLD_TOLERANCE,))
+            kept = []
+            for item in array[idx:]:
+                if self.alerts[item[1]].equal(price):
+                    triggered.append(item[1])
+                else: # threshold at the rounding edge of price, not triggered by equal
+                    kept.append(item)
+            array[idx:] = kept
+        triggered.sort()
+        return [(seq, self.alerts.pop(seq)) for seq in triggered]
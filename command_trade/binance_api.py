@@ -1,23 +1,42 @@
 from .config import Config
 from .logger import Logger
 from .util import convert_to_seconds
+from .kline_store import KlineStore
 import threading
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
 from typing import Dict, Set, Tuple
 from .notification import Message
 from binance.client import Client
 import time
 
+USER_TRADES_LIMIT = 1000 # max page size of futures_account_trades
 BINANCE_INTERVAL = ["1s", "1m", "3m", "5m", "15m", "30m", "1h", "2h", "4h", "6h", "8h", "12h", "1d", "3d", "1w", "1M"]
 
 class BinanceCache:  # pylint: disable=too-few-public-methods
     _balances: Dict[str, float] = {}
     _balances_mutex: threading.Lock = threading.Lock()
+    _symbols: Dict[str, dict] = {} # futures exchange info, symbol -> symbol info (precision, filters, ...)
+    _symbols_mutex: threading.Lock = threading.Lock()
+    _symbol_configs: Dict[str, dict] = {} # symbol -> {"leverage": int, "marginType": CROSSED/ISOLATED}
+    _symbol_configs_mutex: threading.Lock = threading.Lock()
 
     @contextmanager
     def open_balances(self):
         with self._balances_mutex:
             yield self._balances
+
+    @contextmanager
+    def open_symbols(self):
+        with self._symbols_mutex:
+            yield self._symbols
+
+    @contextmanager
+    def open_symbol_configs(self):
+        with self._symbol_configs_mutex:
+            yield self._symbol_configs
 class BinanceAPI:
     def __init__(self, config: Config, logger: Logger):
         self.config = config
@@ -28,6 +47,24 @@ class BinanceAPI:
             tld=config.BINANCE_TLD,
             requests_params={"proxies" : config.PROXIES}
         )
+        # python-binance client is blocking, all calls from coroutines go through this executor
+        self.executor = ThreadPoolExecutor(max_workers=config.BINANCE_MAX_WORKERS, thread_name_prefix="binance_api")
+        self.cache = BinanceCache()
+        self.kline_store = KlineStore(self.binance_client.futures_historical_klines, config.BINANCE_KLINE_CACHE_BYTES)
+        self.exchange_info_refreshed_at = 0.0
+        self.exchange_info_mutex = threading.Lock()
+        self.tickers: Dict[str, dict] = {} # snapshot of all futures 24h tickers, symbol -> ticker
+        self.tickers_refreshed_at = 0.0
+        self.tickers_mutex = threading.Lock()
+        threading.Thread(target=self.refresh_exchange_info_forever, daemon=True).start()
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Run a blocking api call in the executor, so the event loop is not blocked
+        ex: await binance_api.run(binance_api.f_price, symbol)
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
 
     # spot api
     def get_account(self):
@@ -57,12 +94,51 @@ class BinanceAPI:
         return self.binance_client.futures_position_information(symbol=symbol)
     
     def f_get_symbol_info(self, symbol: str):
-        info = self.f_exchange_info()
-        for x in info['symbols']:
-            if x['symbol'] == symbol:
-                return x
-        return None
-            
+        with self.cache.open_symbols() as symbols:
+            info = symbols.get(symbol)
+        if info is None:
+            # unknown symbol (new listing or cache not loaded yet), force refresh but not more often than min refresh
+            self.refresh_exchange_info(self.config.BINANCE_EXCHANGE_INFO_MIN_REFRESH)
+            with self.cache.open_symbols() as symbols:
+                info = symbols.get(symbol)
+        return info
+
+    def refresh_exchange_info(self, min_interval: float = 0):
+        with self.exchange_info_mutex:
+            if time.time() - self.exchange_info_refreshed_at < min_interval:
+                return
+            info = self.f_exchange_info()
+            with self.cache.open_symbols() as symbols:
+                symbols.clear()
+                for x in info['symbols']:
+                    symbols[x['symbol']] = x
+            # only a successful fetch counts, a failed one can be retried right away
+            self.exchange_info_refreshed_at = time.time()
+
+    def refresh_exchange_info_forever(self): # background refresh exchange info cache every ttl
+        while True:
+            try:
+                self.refresh_exchange_info()
+                time.sleep(self.config.BINANCE_EXCHANGE_INFO_TTL)
+            except Exception as err:
+                self.logger.error(Message(
+                    title="Error BinanceAPI.refresh_exchange_info",
+                    body=f"Error: {err=}",
+                    chat_id=self.config.TELEGRAM_LOG_PEER_ID
+                ), True)
+                time.sleep(self.config.BINANCE_EXCHANGE_INFO_MIN_REFRESH)
+
+    def f_open_orders(self, symbol: str | None = None):
+        if symbol is None:
+            return self.binance_client.futures_get_open_orders()
+        return self.binance_client.futures_get_open_orders(symbol=symbol)
+
+    def f_listen_key(self) -> str: # user data stream
+        return self.binance_client.futures_stream_get_listen_key()
+
+    def f_keepalive_listen_key(self, listen_key: str):
+        return self.binance_client.futures_stream_keepalive(listenKey=listen_key)
+
     def f_exchange_info(self):
         return self.binance_client.futures_exchange_info()
 
@@ -73,10 +149,54 @@ class BinanceAPI:
         return self.binance_client.futures_place_batch_order(batchOrders=batch_orders)
     
     def f_change_margin_type(self, symbol: str, marginType: str = "CROSSED"):
-        self.binance_client.futures_change_margin_type(symbol=symbol, marginType=marginType)
+        try:
+            self.binance_client.futures_change_margin_type(symbol=symbol, marginType=marginType)
+        except Exception:
+            self.invalidate_symbol_config(symbol)
+            raise
+        self.update_symbol_config(symbol, margin_type=marginType)
 
     def f_change_leverage(self, symbol: str, leverage: int):
-        return self.binance_client.futures_change_leverage(symbol=symbol, leverage=leverage)
+        try:
+            response = self.binance_client.futures_change_leverage(symbol=symbol, leverage=leverage)
+        except Exception:
+            self.invalidate_symbol_config(symbol)
+            raise
+        self.update_symbol_config(symbol, leverage=int(response["leverage"]))
+        return response
+
+    def cached_symbol_config(self, symbol: str) -> dict | None:
+        with self.cache.open_symbol_configs() as symbol_configs:
+            return symbol_configs.get(symbol)
+
+    def f_symbol_config(self, symbol: str) -> dict:
+        """
+        Leverage and margin type of symbol, fetched once then kept up to date by change calls and account events
+        """
+        symbol_config = self.cached_symbol_config(symbol)
+        if symbol_config is not None:
+            return symbol_config
+        response = self.binance_client.futures_symbol_config(symbol=symbol)[0]
+        self.update_symbol_config(symbol, leverage=int(response["leverage"]), margin_type=response["marginType"])
+        return self.cached_symbol_config(symbol)
+
+    def update_symbol_config(self, symbol: str, leverage: int | None = None, margin_type: str | None = None):
+        # margin type of account events is cross/isolated, of rest api is CROSSED/ISOLATED
+        if margin_type is not None:
+            margin_type = "CROSSED" if margin_type.upper() in ["CROSS", "CROSSED"] else "ISOLATED"
+        with self.cache.open_symbol_configs() as symbol_configs:
+            if symbol not in symbol_configs:
+                if leverage is None or margin_type is None: # partial update, fetch full config later
+                    return
+                symbol_configs[symbol] = {}
+            if leverage is not None:
+                symbol_configs[symbol]["leverage"] = leverage
+            if margin_type is not None:
+                symbol_configs[symbol]["marginType"] = margin_type
+
+    def invalidate_symbol_config(self, symbol: str):
+        with self.cache.open_symbol_configs() as symbol_configs:
+            symbol_configs.pop(symbol, None)
 
     def f_price(self, symbol: str) -> float:
         return float(self.binance_client.futures_symbol_ticker(symbol=symbol)["price"])
@@ -91,10 +211,33 @@ class BinanceAPI:
             range = convert_to_seconds(interval) * 21
         else:
             range = convert_to_seconds(range)
-        return self.binance_client.futures_historical_klines(symbol, interval, round(time.time() - range) * 1000), interval
+        # closed candles are cached, only the missing tail is fetched on repeated charts
+        return self.kline_store.get(symbol, interval, round(time.time() - range) * 1000), interval
 
     def f_24hr_ticker(self, symbol: str):
         return self.binance_client.futures_ticker(symbol=symbol)
+
+    def cached_ticker(self, symbol: str) -> dict | None: # ticker of the snapshot when it is still fresh, no request
+        if time.time() - self.tickers_refreshed_at >= self.config.BINANCE_TICKER_TTL:
+            return None
+        return self.tickers.get(symbol)
+
+    def f_24hr_tickers(self, symbols: list[str]) -> Dict[str, dict]:
+        """
+        24h tickers of many symbols with one request, from a snapshot of all futures tickers refreshed at most every BINANCE_TICKER_TTL.
+        Unknown symbols are not in the result.
+        """
+        with self.tickers_mutex: # concurrent callers wait for the same in-flight fetch
+            if time.time() - self.tickers_refreshed_at >= self.config.BINANCE_TICKER_TTL:
+                self.tickers = {x['symbol']: x for x in self.binance_client.futures_ticker()}
+                self.tickers_refreshed_at = time.time()
+            tickers = self.tickers
+        return {symbol: tickers[symbol] for symbol in symbols if symbol in tickers}
     
-    def f_user_trades(self, symbol: str, orderId: int):
-        return self.binance_client.futures_account_trades(symbol=symbol, orderId=orderId)
\ No newline at end of file
+    def f_user_trades(self, symbol: str, startTime: int): # all trades of symbol since startTime(ms)
+        trades = self.binance_client.futures_account_trades(symbol=symbol, startTime=startTime, limit=USER_TRADES_LIMIT)
+        page = trades
+        while len(page) == USER_TRADES_LIMIT: # full page, there may be more: continue after the last trade id (fromId can't be sent with startTime)
+            page = self.binance_client.futures_account_trades(symbol=symbol, fromId=int(page[-1]["id"]) + 1, limit=USER_TRADES_LIMIT)
+            trades += page
+        return trades
\ No newline at end of file
@@ -0,0 +1,134 @@
+import asyncio
+import io
+import multiprocessing
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import mplfinance as mpf
+
+from .logger import Logger
+from .config import Config
+
+class ChartEngine:
+    """
+    Render candle charts from binance klines, the mplfinance style is built once
+    """
+    def __init__(self, dpi: int = 300, format: str = "png", timezone: str = "Asia/Ho_Chi_Minh"):
+        self.dpi = dpi
+        self.format = format
+        self.timezone = timezone
+        # Create my own `marketcolors` style:
+        mc = mpf.make_marketcolors(up='#2fc71e',down='#ed2f1a',inherit=True)
+        # Create my own `MatPlotFinance` style:
+        self.style = mpf.make_mpf_style(base_mpl_style=['bmh', 'dark_background'], marketcolors=mc, y_on_right=True)
+
+    def to_dataframe(self, klines: list | np.ndarray) -> pd.DataFrame:
+        # klines from rest api are rows of [open_time, "open", "high", "low", "close", "volume", close_time, ...],
+        # convert the first 6 columns to float in one numpy call
+        values = np.asarray(klines)[:, :6].astype(np.float64)
+        df = pd.DataFrame(values[:, 1:], columns=['open', 'high', 'low', 'close', 'volume'])
+        df.index = pd.DatetimeIndex(pd.to_datetime(values[:, 0].astype(np.int64), unit='ms', utc=True).tz_convert(self.timezone), name='date')
+        return df
+
+    def render(self, title: str, klines: list | np.ndarray) -> io.BytesIO:
+        df = self.to_dataframe(klines)
+        buffer = io.BytesIO()
+        fig, axlist = mpf.plot(df, figratio=(10, 6), type="candle", tight_layout=True, ylabel = "Precio ($)", returnfig=True, volume=True, style=self.style, warn_too_much_data=len(df) + 1)
+        # Add Title
+        axlist[0].set_title(title, fontsize=25, style='italic')
+        fig.savefig(fname=buffer, dpi=self.dpi, format=self.format, bbox_inches="tight")
+        plt.close(fig)
+        buffer.seek(0)
+        return buffer
+
+# engine of the current chart worker process, built once by init_worker
+worker_engine: ChartEngine | None = None
+
+def init_worker(dpi: int, format: str):
+    global worker_engine
+    worker_engine = ChartEngine(dpi, format)
+    # render a tiny chart so fonts and the agg backend are loaded before the first /fch
+    worker_engine.render("", [[0, 1, 2, 0.5, 1.5, 1], [60000, 1.5, 2, 1, 1, 1]])
+
+def render_chart(title: str, klines: list | np.ndarray) -> bytes:
+    return worker_engine.render(title, klines).getvalue()
+
+def worker_pid() -> int:
+    return os.getpid()
+
+class ChartPool:
+    """
+    Render charts in worker processes, so matplotlib never holds the GIL of the event loop
+    and several charts can be rendered in parallel
+    """
+    def __init__(self, config: Config, logger: Logger):
+        self.config = config
+        self.logger = logger
+        self.executor = ProcessPoolExecutor(
+            max_workers=config.CHART_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"), # fork is unsafe with the running threads (binance, storage, telebot)
+            initializer=init_worker,
+            initargs=(config.CHART_DPI, config.CHART_FORMAT)
+        )
+
+    async def warm_up(self):
+        # the executor spawns one worker per pending task, submit one task per worker to start all of them
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[loop.run_in_executor(self.executor, worker_pid) for _ in range(self.config.CHART_WORKERS)])
+        self.logger.info(f"Chart workers ready: {self.config.CHART_WORKERS} processes")
+
+    async def render(self, title: str, klines: list | np.ndarray) -> io.BytesIO:
+        loop = asyncio.get_running_loop()
+        return io.BytesIO(await loop.run_in_executor(self.executor, render_chart, title, klines))
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+class CachedChart:
+    def __init__(self, open_time: int, close_time: int, image: bytes):
+        self.open_time = open_time # open time (ms) of the last candle in the chart
+        self.close_time = close_time # close time (ms) of the last candle, the chart is stale after it
+        self.image = image
+        self.file_id: str | None = None # telegram file_id once the image was sent
+
+class ChartCache:
+    """
+    Rendered charts by (symbol, interval, range), a chart is reused while its last candle is still open.
+    Bounded by total image size, least recently used are evicted.
+    """
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.charts: OrderedDict[tuple, CachedChart] = OrderedDict()
+        self.nbytes = 0
+
+    def get(self, key: tuple) -> CachedChart | None:
+        chart = self.charts.get(key)
+        if chart is None:
+            return None
+        if time.time() * 1000 > chart.close_time: # a new candle is open
+            self.remove(key)
+            return None
+        self.charts.move_to_end(key)
+        return chart
+
+    def put(self, key: tuple, chart: CachedChart):
+        self.remove(key)
+        if len(chart.image) > self.max_bytes:
+            return
+        self.charts[key] = chart
+        self.nbytes += len(chart.image)
+        while self.nbytes > self.max_bytes:
+            _, evicted = self.charts.popitem(last=False)
+            self.nbytes -= len(evicted.image)
+
+    def remove(self, key: tuple):
+        chart = self.charts.pop(key, None)
+        if chart is not None:
+            self.nbytes -= len(chart.image)
@@ -1,6 +1,6 @@
 from .logger import Logger
 from .config import Config
-from .notification import Message
+from .notification import Message, FileIdCache
 from .util import remove_job_if_exists
 from telegram import Update, LinkPreviewOptions, MessageEntity
 import telegramify_markdown
@@ -9,59 +9,98 @@ from telegram.ext import ContextTypes, Application
 import requests
 from .binance_api import BinanceAPI
 from .threads import Threads
+from .stream import PriceStream, UserDataStream
+from .account import AccountMirror
+from .alert import PriceAlert, AlertBook
+from .storage import Storage
+from .chart import ChartPool, ChartCache, CachedChart
+from .order_builder import OrderBuilder, SymbolRules
 import json
 import traceback
-import pandas as pd
-import matplotlib.pyplot as plt
-import mplfinance as mpf
-import io
 from datetime import datetime
 import time
 import pytz
 import asyncio
 from collections import defaultdict
+import heapq
+from decimal import Decimal
 
 JOB_NAME_FSTATS = "fstats"
 JOB_NAME_FALERT_TRACK = "falert_track"
 JOB_NAME_FREPLIES_TRACK = "freplies_track"
-class PriceAlert:
-    def __init__(self, op: str, price: float, gap: float = 0.5):
-        self.op = op
-        self.price = price
-        self.gap = gap
-    def __str__(self):
-        return self.op + " " + str(self.price) + f" ({self.gap}%)"
-    def equal(self, price: float):
-        if (abs(self.price - price) / self.price) <= self.gap / 100.0: # check around gap%
-            return True
-        if self.op == '<':
-            return price <= self.price
-        else:
-            return price >= self.price
 class ThreadsReply:
-    def __init__(self, url: str, max_timestamp: int):
+    """
+    Tracked thread with a bounded index of seen reply pk (min-heap by published time + hash set).
+    When the index is full the oldest reply is evicted and min_timestamp moves up to it,
+    replies published at or before min_timestamp (seed time - sla, or evicted) are treated as seen
+    """
+    def __init__(self, url: str, max_timestamp: int, seen_limit: int = 1000):
         self.url = url
-        self.max_timestamp = max_timestamp
+        self.max_timestamp = max_timestamp # latest reply sent
+        self.min_timestamp = max_timestamp
+        self.seen_limit = seen_limit
+        self.seen_heap: list[tuple[int, int | str]] = [] # (published_on, pk)
+        self.seen_set: set[int | str] = set()
+    def key(self, pk: str) -> int | str:
+        return int(pk) if str(pk).isdigit() else pk # int is more compact than str
+    def is_new(self, pk: str, published_on: int) -> bool:
+        return published_on > self.min_timestamp and self.key(pk) not in self.seen_set
+    def mark_seen(self, pk: str, published_on: int):
+        self.seen_set.add(self.key(pk))
+        heapq.heappush(self.seen_heap, (published_on, self.key(pk)))
+        self.max_timestamp = max(self.max_timestamp, published_on)
+        while len(self.seen_heap) > self.seen_limit:
+            old_published_on, old_pk = heapq.heappop(self.seen_heap)
+            self.seen_set.discard(old_pk)
+            self.min_timestamp = max(self.min_timestamp, old_published_on)
+    def dump_seen(self) -> str:
+        return json.dumps(self.seen_heap)
+    def load_seen(self, seen: str):
+        for published_on, pk in json.loads(seen):
+            self.mark_seen(pk, published_on)
     def __str__(self):
         return f"{self.url} ({datetime.fromtimestamp(self.max_timestamp, tz=pytz.timezone('Asia/Ho_Chi_Minh'))})"
 EPS = 1e-2
+PNL_CLOCK_SKEW = 5000 # ms, trades are searched from a bit before the close orders
+PNL_MAX_ATTEMPTS = 3
+BATCH_ORDER_LIMIT = 5 # max orders of futures_place_batch_order
 class Command:
-    def __init__(self, config: Config, logger: Logger, binance_api: BinanceAPI, threads: Threads):
+    def __init__(self, config: Config, logger: Logger, binance_api: BinanceAPI, threads: Threads, price_stream: PriceStream, storage: Storage, chart_pool: ChartPool, user_stream: UserDataStream, account_mirror: AccountMirror):
         self.config = config
         self.logger = logger
         self.binance_api = binance_api
         self.threads = threads
-        self.map_alert_price = defaultdict(list)
+        self.price_stream = price_stream
+        self.storage = storage
+        self.chart_pool = chart_pool
+        self.user_stream = user_stream
+        self.account_mirror = account_mirror
+        self.background_tasks: set[asyncio.Task] = set()
+        self.order_builder = OrderBuilder(binance_api, price_stream)
+        self.chart_cache = ChartCache(config.CHART_CACHE_BYTES)
+        self.file_ids = FileIdCache(config.TELEGRAM_FILE_ID_CACHE_SIZE)
+        self.application: Application | None = None
+        self.map_alert_price: defaultdict[str, AlertBook] = defaultdict(AlertBook)
+        self.alert_lock = asyncio.Lock() # guard map_alert_price between commands, falert_track job and price stream
+        self.alert_tracking = False
         self.map_tracking_replies = defaultdict(ThreadsReply)
         
     async def post_init(self, application: Application):
         self.logger.info("Start server")
+        self.application = application
+        if self.config.BINANCE_STREAM_ENABLED:
+            self.price_stream.add_listener(self.on_price_update)
+            self.price_stream.start()
+        if self.config.BINANCE_USER_STREAM_ENABLED:
+            self.user_stream.start()
+        await self.chart_pool.warm_up()
+        self.f_restore(application)
         await application.bot.set_my_commands([
             ('help', 'Get all commands'),
             ('start', 'Get public, local IP of the server'),
             ('info', 'Get current trade, balance and pnl'),
             ('forder', 'forder buy/sell coin leverage margin sl(opt) tp(opt)'),
-            ('fclose', 'fclose coin'),
+            ('fclose', 'fclose coin1 coin2 ... or fclose all'),
             ('fch', "Get chart 'fch coin interval(opt, df=15m) range(opt, df=21 * interval)'"),
             ('fp', "Get prices 'fp coin1 coin2 ....'"),
             ('fstats', "Schedule get stats 'fstats interval(seconds)'"),
@@ -78,7 +117,7 @@ class Command:
         ])
         try:
             commands = await application.bot.get_my_commands()
-            public_ip = requests.get('https://api.ipify.org', proxies=self.config.PROXIES).text
+            public_ip = (await asyncio.to_thread(requests.get, 'https://api.ipify.org', proxies=self.config.PROXIES)).text
             msg = f"👋 **Start Command Trade - Time: {datetime.fromtimestamp(int(time.time()), tz=pytz.timezone('Asia/Ho_Chi_Minh'))}**\n"
             msg += f"**Your server public IP is `{public_ip}`, here is list commands:**\n"
             for command in commands:
@@ -92,11 +131,20 @@ class Command:
                 chat_id=self.config.TELEGRAM_LOG_PEER_ID
             ), True)
 
+    async def post_shutdown(self, application: Application):
+        self.logger.info("Stop server")
+        await self.price_stream.stop()
+        await self.user_stream.stop()
+        await self.threads.stop()
+        self.storage.close()
+        self.chart_pool.shutdown()
+        self.binance_api.executor.shutdown(wait=False, cancel_futures=True)
+
     async def help(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         msg = "/start - Get public, local IP of the server\n"
         msg += "/info - Get current trade, balance and pnl\n"
         msg += "/forder - Make futures market order 'forder buy/sell coin leverage margin sl(optional) tp(optional)'\n"
-        msg += "/fclose - Close all position and open order 'fclose coin'\n"
+        msg += "/fclose - Close all position and open order 'fclose coin1 coin2 ...', 'fclose all' for all positions\n"
         msg += "/fch - Get chart 'fch coin interval(optional, default=15m) range(optional, default=21 * interval)'\n"
         msg += "/fp - Get prices 'fp coin1 coin2 ....'\n"
         msg += "/fstats - Schedule get stats for current positions 'fstats interval(seconds)'\n"
@@ -123,7 +171,7 @@ class Command:
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Handles command /start from the admin"""
         try:
-            public_ip = requests.get('https://api.ipify.org', proxies=self.config.PROXIES).text
+            public_ip = (await asyncio.to_thread(requests.get, 'https://api.ipify.org', proxies=self.config.PROXIES)).text
             await update.message.reply_markdown(text=f"👋 Hello, your server public IP is `{public_ip}`\nCommand `/fstats` interval(seconds) to schedule get stats for current positions")
         except Exception as err:
             self.logger.error(Message(
@@ -134,7 +182,14 @@ class Command:
     
     async def info(self, update: Update, context: ContextTypes.DEFAULT_TYPE): # info current spot/future account, ex: balance, pnl, orders, ...
         try:
-            msg = self.info_spot() + '\n--------------------\n' + self.info_future()[0]
+            # spot and futures sections are fetched concurrently, a slow section doesn't hold back the others
+            (spot, spot_timing), (future, future_timing) = await asyncio.gather(
+                self.info_section("SPOT", self.info_spot()),
+                self.info_section("Future", self.info_future())
+            )
+            if isinstance(future, tuple):
+                future = future[0]
+            msg = spot + '\n--------------------\n' + future + f"\n\n⏱ {spot_timing}, {future_timing}"
             msg = telegramify_markdown.markdownify(msg)
             await update.message.reply_text(text=msg, parse_mode=ParseMode.MARKDOWN_V2, link_preview_options=LinkPreviewOptions(is_disabled=True))
         except Exception as err:
@@ -144,6 +199,24 @@ class Command:
                 chat_id=self.config.TELEGRAM_LOG_PEER_ID
             ), True)
 
+    async def info_section(self, name: str, coroutine):
+        """
+        Await one section of /info with INFO_TIMEOUT, return (result or error text, timing text)
+        """
+        start = time.time()
+        try:
+            result = await asyncio.wait_for(coroutine, timeout=self.config.INFO_TIMEOUT)
+            return result, f"{name}: {(time.time() - start) * 1000:.0f}ms"
+        except asyncio.TimeoutError:
+            return f"**{name} Account**: timeout after {self.config.INFO_TIMEOUT}s", f"{name}: timeout"
+        except Exception as err:
+            self.logger.error(Message(
+                title=f"Error Command.info_section - {name}",
+                body=f"Error: {err=}",
+                chat_id=self.config.TELEGRAM_LOG_PEER_ID
+            ), True)
+            return f"**{name} Account**: error {err}", f"{name}: error"
+
     async def info_message(self, update: Update, context: ContextTypes.DEFAULT_TYPE): # info current spot/future account, ex: balance, pnl, orders, ...
         try:
             if update.message and update.message.chat_id == self.config.TELEGRAM_GROUP_CHAT_ID and update.message.forward_origin:
@@ -186,11 +259,11 @@ class Command:
         margin = float(context.args[3])
         try:
             symbol = coin + "USDT"
-            # try to change leverage and margin_type for symbol first
-            self.f_set_leverage_and_margin_type(symbol, leverage)
-            batch_orders = self.f_get_orders(side, symbol, leverage, margin, context)
+            # change margin_type and leverage for symbol (if needed), the order is only built once both are applied
+            await self.f_set_leverage_and_margin_type(symbol, leverage)
+            batch_orders = await self.f_get_orders(side, symbol, leverage, margin, context)
             self.logger.info(Message(f"👋 Your order for {symbol} is {json.dumps(batch_orders)}"))
-            responses = self.binance_api.f_batch_order(batch_orders)
+            responses = await self.binance_api.run(self.binance_api.f_batch_order, batch_orders)
             ok = True
             for idx in range(len(responses)):
                 if "code" in responses[idx] and int(responses[idx]["code"]) < 0:
@@ -203,6 +276,8 @@ class Command:
                     ok = False
             if ok:
                 await update.message.reply_text(text=f"👋 Your order for {symbol} is successful\n {json.dumps(batch_orders, indent=2)}")
+        except ValueError as err: # margin type not applied or invalid quantity, nothing was sent
+            await update.message.reply_text(text=f"❌ Your order for {symbol} is not sent\n{err}")
         except Exception as err:
             self.logger.error(Message(
                 title=f"Error Command.forder - {side} - {symbol} - {leverage} - {margin}",
@@ -219,11 +294,11 @@ class Command:
         price = context.args[4]
         try:
             symbol = coin + "USDT"
-            # try to change leverage and margin_type for symbol first
-            self.f_set_leverage_and_margin_type(symbol, leverage)
-            order = self.f_get_limit_order(side, symbol, leverage, margin, price)
+            # change margin_type and leverage for symbol (if needed), the order is only built once both are applied
+            await self.f_set_leverage_and_margin_type(symbol, leverage)
+            order = await self.f_get_limit_order(side, symbol, leverage, margin, price)
             self.logger.info(Message(f"👋 Your limit order for {symbol} is {json.dumps(order)}"))
-            responses = self.binance_api.f_order(order)
+            responses = await self.binance_api.run(self.binance_api.f_order, order)
             if "code" in responses and int(responses["code"]) < 0:
                 # Error
                 self.logger.error(Message(
@@ -233,6 +308,8 @@ class Command:
                 ), True)
             else:
                 await update.message.reply_text(text=f"👋 Your limit order for {symbol} is successful\n {json.dumps(order, indent=2)}")
+        except ValueError as err: # margin type not applied or invalid quantity, nothing was sent
+            await update.message.reply_text(text=f"❌ Your limit order for {symbol} is not sent\n{err}")
         except Exception as err:
             self.logger.error(Message(
                 title=f"Error Command.flimit - {side} - {symbol} - {leverage} - margin: ${margin} - price: ${price}",
@@ -240,43 +317,51 @@ class Command:
                 chat_id=self.config.TELEGRAM_LOG_PEER_ID
             ), True)
     
-    # fclose coin
+    # fclose coin1 coin2 ... or fclose all
     async def fclose(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        coin = context.args[0].upper()
+        symbol = " ".join(context.args).upper()
         try:
-            symbol = coin + "USDT"
-            cancel_open_orders_response = self.binance_api.f_cancel_all_open_orders(symbol)
-            msg = f"👋 Cancel all open orders for {symbol}\n {json.dumps(cancel_open_orders_response, indent=2)}\n-------------\n"
-
-            batch_orders = self.f_get_close_positions(symbol)
+            # read all positions once, then cancel open orders and submit close batches of all symbols concurrently
+            list_symbol = None if context.args[0].lower() == "all" else [coin.upper() + "USDT" for coin in context.args]
+            batch_orders = [order for order in await self.f_get_close_positions() if list_symbol is None or order["symbol"] in list_symbol]
+            if list_symbol is None:
+                # symbols with open orders but no position have nothing to close, their orders are cancelled too
+                # (the mirror was just resynced by f_get_close_positions when it was not fresh)
+                list_symbol = list(dict.fromkeys([order["symbol"] for order in batch_orders] + sorted({order["symbol"] for order in self.account_mirror.orders.values()})))
             self.logger.info(Message(f"👋 Your close positions for {symbol} is {json.dumps(batch_orders)}"))
-            if len(batch_orders) > 0:
-                ok = True
-                responses = self.binance_api.f_batch_order(batch_orders)
-                for idx in range(len(responses)):
-                    if "code" in responses[idx] and int(responses[idx]["code"]) < 0:
+            list_chunk = [batch_orders[i:i + BATCH_ORDER_LIMIT] for i in range(0, len(batch_orders), BATCH_ORDER_LIMIT)]
+            start_time = int(time.time() * 1000) - PNL_CLOCK_SKEW
+            cancel_responses, batch_responses = await asyncio.gather(
+                asyncio.gather(*[self.binance_api.run(self.binance_api.f_cancel_all_open_orders, close_symbol) for close_symbol in list_symbol], return_exceptions=True),
+                asyncio.gather(*[self.binance_api.run(self.binance_api.f_batch_order, chunk) for chunk in list_chunk], return_exceptions=True)
+            )
+            indent = 2 if len(list_symbol) <= 1 else None # keep reply of many symbols under telegram limit
+            msg = ""
+            for close_symbol, response in zip(list_symbol, cancel_responses):
+                msg += f"👋 Cancel all open orders for {close_symbol}\n {json.dumps(response if not isinstance(response, Exception) else str(response), indent=indent)}\n"
+            msg += "-------------\n"
+
+            map_order_id: dict[str, list[int]] = defaultdict(list) # symbol -> filled close order ids
+            for chunk, responses in zip(list_chunk, batch_responses):
+                if isinstance(responses, Exception):
+                    responses = [{"code": -1, "msg": str(responses)}] * len(chunk)
+                for order, response in zip(chunk, responses):
+                    if "code" in response and int(response["code"]) < 0:
                         # Error
                         self.logger.error(Message(
-                            title=f"Error Command.forder - {batch_orders[idx]['side']} - {batch_orders[idx]['type']} - {symbol}",
-                            body=f"Error: {responses[idx]['msg']}",
+                            title=f"Error Command.fclose - {order['side']} - {order['type']} - {order['symbol']}",
+                            body=f"Error: {response['msg']}",
                             chat_id=self.config.TELEGRAM_LOG_PEER_ID
                         ), True)
-                        ok = False
-                if ok:
-                    for idx in range(len(batch_orders)):
-                        orderId = int(responses[idx]["orderId"])
-                        userTrades = self.binance_api.f_user_trades(symbol, orderId)
-                        totalPnl = 0.0
-                        for trade in userTrades:
-                            totalPnl += float(trade["realizedPnl"])
-                            # should need minus commission?
-                        batch_orders[idx]["result_trade"] = {
-                            "order_id": orderId,
-                            "pnl": f"${round(totalPnl, 2)}"
-                        }
-
-            msg += f"👋 Your close positions for {symbol} is successful\n {json.dumps(batch_orders, indent=2)}"
+                        order["error"] = response["msg"]
+                        continue
+                    order["order_id"] = int(response["orderId"])
+                    map_order_id[order["symbol"]].append(int(response["orderId"]))
+
+            msg += f"👋 Your close positions for {symbol} is successful\n {json.dumps(batch_orders, indent=indent)}"
             await update.message.reply_text(text=msg)
+            for close_symbol, list_order_id in map_order_id.items(): # realized pnl is not on the close path, reply it when trades are available
+                self.run_background(self.f_reply_pnl(update, close_symbol, list_order_id, start_time))
         except Exception as err:
             self.logger.error(Message(
                 title=f"Error Command.fclose - {symbol}",
@@ -284,6 +369,43 @@ class Command:
                 chat_id=self.config.TELEGRAM_LOG_PEER_ID
             ), True)
 
+    def run_background(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self.background_tasks.add(task) # keep a reference until done, the loop only keeps weak references
+        task.add_done_callback(self.background_tasks.discard)
+
+    async def f_resolve_pnl(self, symbol: str, list_order_id: list[int], start_time: int) -> dict[int, float]:
+        """
+        Realized pnl of orders: one request for all trades of symbol since start_time, grouped by orderId.
+        Retry a few times while some orders have no trade yet.
+        """
+        map_pnl: dict[int, float] = {}
+        for attempt in range(PNL_MAX_ATTEMPTS):
+            trades = await self.binance_api.run(self.binance_api.f_user_trades, symbol, start_time)
+            map_pnl = {}
+            for trade in trades:
+                if int(trade["orderId"]) in list_order_id:
+                    map_pnl[int(trade["orderId"])] = map_pnl.get(int(trade["orderId"]), 0.0) + float(trade["realizedPnl"])
+                    # should need minus commission?
+            if len(map_pnl) == len(list_order_id) or attempt == PNL_MAX_ATTEMPTS - 1:
+                break
+            await asyncio.sleep(attempt + 1)
+        return map_pnl
+
+    async def f_reply_pnl(self, update: Update, symbol: str, list_order_id: list[int], start_time: int):
+        try:
+            map_pnl = await self.f_resolve_pnl(symbol, list_order_id, start_time)
+            msg = f"💰 Realized PNL for {symbol}: **${round(sum(map_pnl.values()), 2)}**\n"
+            for order_id in list_order_id:
+                msg += f"- order {order_id}: " + (f"**${round(map_pnl[order_id], 2)}**\n" if order_id in map_pnl else "not filled yet\n")
+            await update.message.reply_text(text=telegramify_markdown.markdownify(msg), parse_mode=ParseMode.MARKDOWN_V2)
+        except Exception as err:
+            self.logger.error(Message(
+                title=f"Error Command.f_reply_pnl - {symbol}",
+                body=f"Error: {err=}",
+                chat_id=self.config.TELEGRAM_LOG_PEER_ID
+            ), True)
+
     # fch coin interval(optional, default=15m) range(optional, default=21 * interval)
     async def fchart(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         coin = context.args[0].upper()
@@ -291,11 +413,19 @@ class Command:
         range = context.args[2] if len(context.args) > 2 else None
         try:
             symbol = coin + "USDT"
-            data, interval = self.binance_api.f_get_historical_klines(symbol, interval, range)
-            ticker_24h = self.binance_api.f_24hr_ticker(symbol)
-            buffer = self.generate_chart("FUTURES", symbol, data, interval)
-            caption_msg = self.build_caption(f"https://www.binance.com/en/futures/{symbol}", symbol, ticker_24h)
-            await update.message.reply_photo(photo=buffer, caption=telegramify_markdown.markdownify(caption_msg), parse_mode=ParseMode.MARKDOWN_V2)
+            key = (symbol, interval, range)
+            chart = self.chart_cache.get(key) # same chart while the last candle is still open
+            if chart is None:
+                data, interval = await self.binance_api.run(self.binance_api.f_get_historical_klines, symbol, interval, range)
+                buffer = await self.chart_pool.render(f"FUTURES - {symbol} - {interval}", data)
+                chart = CachedChart(int(data[-1, 0]), int(data[-1, 6]), buffer.getvalue())
+                chart.file_id = self.file_ids.get(self.file_ids.content_key(chart.image)) # unchanged chart already uploaded
+                self.chart_cache.put(key, chart)
+            ticker_24h = await self.binance_api.run(self.binance_api.f_24hr_ticker, symbol)
+            caption_msg = await self.build_caption(f"https://www.binance.com/en/futures/{symbol}", symbol, ticker_24h)
+            message = await update.message.reply_photo(photo=chart.file_id or chart.image, caption=telegramify_markdown.markdownify(caption_msg), parse_mode=ParseMode.MARKDOWN_V2)
+            if chart.file_id is None:
+                chart.file_id = self.file_ids.put_message(self.file_ids.content_key(chart.image), message)
         except Exception as err:
             self.logger.error(Message(
                 title=f"Error Command.fchart - {symbol}",
@@ -307,12 +437,16 @@ class Command:
     async def fprices(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         try:
             caption_msg = ''
-            for coin in context.args:
-                symbol = coin.upper() + "USDT"
-                ticker_24h = self.binance_api.f_24hr_ticker(symbol)
+            symbol = None
+            list_symbol = [coin.upper() + "USDT" for coin in context.args]
+            tickers = await self.binance_api.run(self.binance_api.f_24hr_tickers, list_symbol)
+            for symbol in list_symbol:
                 if len(caption_msg) > 0:
                     caption_msg += '---------------------\n'
-                caption_msg = caption_msg + self.build_caption(f"https://www.binance.com/en/futures/{symbol}", symbol, ticker_24h)
+                if symbol not in tickers:
+                    caption_msg += f"#{symbol}: not found\n"
+                    continue
+                caption_msg = caption_msg + await self.build_caption(f"https://www.binance.com/en/futures/{symbol}", symbol, tickers[symbol])
             await update.message.reply_text(text=telegramify_markdown.markdownify(caption_msg), parse_mode=ParseMode.MARKDOWN_V2, link_preview_options=LinkPreviewOptions(is_disabled=True))
         except Exception as err:
             self.logger.error(Message(
@@ -339,10 +473,10 @@ class Command:
         coin = context.args[0].upper()
         try:
             symbol = coin + "USDT"
-            batch_orders = self.f_get_tp_sl_orders(symbol, context)
+            batch_orders = await self.f_get_tp_sl_orders(symbol, context)
             if len(batch_orders) > 0:
                 self.logger.info(Message(f"👋 Your tp/sl positions for {symbol} is {json.dumps(batch_orders)}"))
-                responses = self.binance_api.f_batch_order(batch_orders)
+                responses = await self.binance_api.run(self.binance_api.f_batch_order, batch_orders)
                 ok = True
                 for idx in range(len(responses)):
                     if "code" in responses[idx] and int(responses[idx]["code"]) < 0:
@@ -368,8 +502,9 @@ class Command:
     async def falert(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         try:
             list_symbol = []
-            for input in context.args:
-                list_symbol.append(self.f_alert(input))
+            async with self.alert_lock:
+                for input in context.args:
+                    list_symbol.append(self.f_alert(input))
             await update.message.reply_text(text=telegramify_markdown.markdownify(f"👋 Your set alert for **{', '.join(list_symbol)}** successfully\nCommand `/falert_track` interval(seconds) for tracking alert."), parse_mode=ParseMode.MARKDOWN_V2)
         except Exception as err:
             self.logger.error(Message(
@@ -391,7 +526,8 @@ class Command:
         symbol = coin + "USDT"
         for price_str in array[2].split(','):
             price = float(price_str)
-            self.map_alert_price[symbol].append(PriceAlert(op, price, gap))
+            seq = self.map_alert_price[symbol].add(PriceAlert(op, price, gap))
+            self.storage.put_alert(symbol, seq, op, price, gap)
         return symbol
 
     # falert_track intervals(seconds)
@@ -431,12 +567,14 @@ class Command:
     async def falert_remove(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         try:
             list_symbol = []
-            if len(context.args) == 1 and context.args[0] == 'all':
-                list_symbol.append('all symbol')
-                self.map_alert_price.clear()
-            else:
-                for input in context.args:
-                    list_symbol.append(self.f_alert_remove(input))
+            async with self.alert_lock:
+                if len(context.args) == 1 and context.args[0] == 'all':
+                    list_symbol.append('all symbol')
+                    self.map_alert_price.clear()
+                    self.storage.delete_alerts()
+                else:
+                    for input in context.args:
+                        list_symbol.append(self.f_alert_remove(input))
             await update.message.reply_text(text=telegramify_markdown.markdownify(f"👋 Your removed alert for **{', '.join(list_symbol)}** successfully\nCommand `/falert_list` to see current alert."), parse_mode=ParseMode.MARKDOWN_V2)
         except Exception as err:
             self.logger.error(Message(
@@ -450,7 +588,8 @@ class Command:
         try:
             url = context.args[0]
             message_id = context.args[1]
-            self.map_tracking_replies[message_id] = ThreadsReply(url, int(time.time()) - self.config.THREADS_SLA)
+            self.map_tracking_replies[message_id] = ThreadsReply(url, int(time.time()) - self.config.THREADS_SLA, self.config.THREADS_SEEN_LIMIT)
+            self.storage.put_reply(message_id, self.map_tracking_replies[message_id])
             await update.message.reply_text(text=telegramify_markdown.markdownify(f"👋 Your set track replies for **{url}** to thread {message_id} successfully\nCommand `/freplies_track` interval(seconds) for tracking replies."), parse_mode=ParseMode.MARKDOWN_V2)
         except Exception as err:
             self.logger.error(Message(
@@ -496,10 +635,12 @@ class Command:
             if len(context.args) == 1 and context.args[0] == 'all':
                 list_message_id.append('all message_id')
                 self.map_tracking_replies.clear()
+                self.storage.delete_replies()
             else:
                 for message_id in context.args:
                     list_message_id.append(message_id)
                     self.map_tracking_replies.pop(message_id, 'None')
+                    self.storage.delete_replies(message_id)
             await context.bot.send_message(chat_id, text=telegramify_markdown.markdownify(f"👋 Your removed replies for **{', '.join(list_message_id)}** successfully\nCommand `/freplies_list` to see current replies."), parse_mode=ParseMode.MARKDOWN_V2)
         except Exception as err:
             self.logger.error(Message(
@@ -512,28 +653,43 @@ class Command:
         chat_id = self.config.TELEGRAM_LOG_PEER_ID
         if len(self.map_tracking_replies) == 0:
             remove_job_if_exists(JOB_NAME_FREPLIES_TRACK, context)
+            self.storage.delete_job(JOB_NAME_FREPLIES_TRACK)
             await context.bot.send_message(chat_id, text=telegramify_markdown.markdownify("👋 You don't have any replies for tracking at this time!\nJob was removed, please command `/freplies_track` interval(seconds) when create a new reply."), parse_mode=ParseMode.MARKDOWN_V2)
             return
-        replies = []
-        for message_id in self.map_tracking_replies:
-            replies.extend(await self.f_get_replies(message_id))
-        for message in replies:
-            self.logger.info(message, True)
+        semaphore = asyncio.Semaphore(self.config.THREADS_CONCURRENCY)
+        await asyncio.gather(*[self.f_send_replies(message_id, semaphore) for message_id in list(self.map_tracking_replies)])
         await asyncio.sleep(1)
 
+    # scrape one tracked thread with bounded concurrency and timeout, send its new replies as soon as it is done
+    async def f_send_replies(self, message_id: str, semaphore: asyncio.Semaphore):
+        try:
+            async with semaphore:
+                replies = await asyncio.wait_for(self.f_get_replies(message_id), timeout=self.config.THREADS_TIMEOUT)
+            for message in replies:
+                self.logger.info(message, True)
+        except Exception as err:
+            self.logger.error(Message(
+                title=f"Error Command.f_send_replies - {message_id}",
+                body=f"Error: {err=}",
+                chat_id=self.config.TELEGRAM_LOG_PEER_ID
+            ), True)
+
     async def f_get_replies(self, message_id: str) -> list[Message]:
-        threads_reply = self.map_tracking_replies[message_id]
+        threads_reply = self.map_tracking_replies.get(message_id)
+        if threads_reply is None: # removed before its turn
+            return []
         response = await self.threads.scrape_thread(threads_reply.url)
         if "thread" not in response:
-            return
+            return []
         thread = response["thread"]
-        replies = response["replies"]
-        replies.sort(key = lambda reply: reply["published_on"])
-        max_timestamp = threads_reply.max_timestamp
+        new_replies = []
+        for reply in response["replies"]:
+            if threads_reply.is_new(reply["pk"], reply["published_on"]):
+                threads_reply.mark_seen(reply["pk"], reply["published_on"])
+                new_replies.append(reply)
+        new_replies.sort(key = lambda reply: reply["published_on"]) # only sort new replies, to send in order
         list_replies = []
-        for reply in replies:
-            if reply["published_on"] <= threads_reply.max_timestamp:
-                continue
+        for reply in new_replies:
             title = f"{reply['username']} - Time: {datetime.fromtimestamp(reply['published_on'], tz=pytz.timezone('Asia/Ho_Chi_Minh'))}"
             if reply["username"] == thread["username"]:
                 title += f" - {self.config.TELEGRAM_ME}"
@@ -544,8 +700,8 @@ class Command:
                 chat_id=self.config.TELEGRAM_GROUP_CHAT_ID,
                 group_message_id=int(message_id)
             ))
-            max_timestamp = reply["published_on"]
-        threads_reply.max_timestamp = max_timestamp
+        if len(new_replies) > 0 and message_id in self.map_tracking_replies: # could be removed while scraping
+            self.storage.put_reply(message_id, threads_reply)
         return list_replies
 
     # Format remove: coin:all/index0,index1,...
@@ -559,10 +715,11 @@ class Command:
         if 'a' in params.lower():
             self.map_alert_price[symbol].clear()
             self.map_alert_price.pop(symbol, 'None')
+            self.storage.delete_alerts(symbol)
         else:
             list_idx = [int(idx_str) for idx_str in params.split(',')]
-            for idx_removed in sorted(list_idx, reverse=True):
-                self.map_alert_price[symbol].pop(idx_removed)
+            for seq in self.map_alert_price[symbol].remove_indices(list_idx):
+                self.storage.delete_alert(symbol, seq)
             if len(self.map_alert_price[symbol]) == 0:
                 self.map_alert_price.pop(symbol, 'None')  
         return symbol              
@@ -570,44 +727,66 @@ class Command:
     async def f_get_alert_track(self, context: ContextTypes.DEFAULT_TYPE):
         chat_id = self.config.TELEGRAM_ALERT_CHAT_ID
         if len(self.map_alert_price) == 0:
+            self.alert_tracking = False
             remove_job_if_exists(JOB_NAME_FALERT_TRACK, context)
+            self.storage.delete_job(JOB_NAME_FALERT_TRACK)
             await context.bot.send_message(chat_id, text=telegramify_markdown.markdownify("👋 You don't have any alert for tracking at this time!\nJob was removed, please command `/falert_track` interval(seconds) when create a new alert."), parse_mode=ParseMode.MARKDOWN_V2)
             return
-        msg = ""
-        list_symbol = []
-        list_removed = []
-        for symbol in self.map_alert_price:
-            ticker_24h = self.binance_api.f_24hr_ticker(symbol)
-            symbol_price = float(ticker_24h['lastPrice'])
-            list_index_remove = []
-            for idx, price_alert in enumerate(self.map_alert_price[symbol]):
-                if price_alert.equal(symbol_price) == False:
+        tickers = {}
+        list_missing = []
+        for symbol in list(self.map_alert_price):
+            ticker_24h = self.price_stream.get_ticker(symbol)
+            if ticker_24h is None: # stream is stale or not enabled, fallback to rest api
+                list_missing.append(symbol)
+            else:
+                tickers[symbol] = ticker_24h
+        if len(list_missing) > 0:
+            tickers.update(await self.binance_api.run(self.binance_api.f_24hr_tickers, list_missing))
+        await self.f_check_alerts(context.bot, tickers)
+        await asyncio.sleep(1)
+
+    async def on_price_update(self, tickers: dict[str, dict]): # listener of price stream, check alert on each update
+        if not self.alert_tracking or self.application is None:
+            return
+        tickers = {symbol: tickers[symbol] for symbol in self.map_alert_price if symbol in tickers}
+        if len(tickers) > 0:
+            await self.f_check_alerts(self.application.bot, tickers)
+
+    async def f_check_alerts(self, bot, tickers: dict[str, dict]):
+        chat_id = self.config.TELEGRAM_ALERT_CHAT_ID
+        list_triggered = []
+        async with self.alert_lock:
+            for symbol, ticker_24h in tickers.items():
+                if symbol not in self.map_alert_price:
                     continue
-                if len(msg) > 0 and len(list_index_remove) == 0:
-                    msg += '---------------------\n'
-                list_index_remove.append(idx)
-                msg += f"🔔 Alert **{symbol}**, setup: **{str(price_alert)}**, chart: `/fch {symbol.removesuffix('USDT')}`\n"
-            if len(list_index_remove) > 0:
-                list_symbol.append(symbol)
-                for idx in sorted(list_index_remove, reverse=True):
-                    list_removed.append((symbol, idx))
-                msg = msg + '\n' + self.build_caption(f"https://www.binance.com/en/futures/{symbol}", symbol, ticker_24h)
-        if msg != "":
-            for removed in list_removed:
-                symbol = removed[0]
-                idx = removed[1]
-                self.map_alert_price[symbol].pop(idx)
-                if len(self.map_alert_price[symbol]) == 0:
+                alert_book = self.map_alert_price[symbol]
+                triggered = []
+                for seq, price_alert in alert_book.pop_triggered(float(ticker_24h['lastPrice'])):
+                    self.storage.delete_alert(symbol, seq)
+                    triggered.append(price_alert)
+                if len(triggered) == 0:
+                    continue
+                if len(alert_book) == 0:
                     self.map_alert_price.pop(symbol, 'None')
-            msg = f"🔔 Price alert {self.config.TELEGRAM_ME}, list: **{', '.join(list_symbol)}**\n\n" + msg
-            await context.bot.send_message(chat_id, text=telegramify_markdown.markdownify(msg), parse_mode=ParseMode.MARKDOWN_V2, link_preview_options=LinkPreviewOptions(is_disabled=True))
-        await asyncio.sleep(1)
+                list_triggered.append((symbol, ticker_24h, triggered))
+        if len(list_triggered) == 0:
+            return
+        msg = ""
+        for symbol, ticker_24h, triggered in list_triggered:
+            if len(msg) > 0:
+                msg += '---------------------\n'
+            for price_alert in triggered:
+                msg += f"🔔 Alert **{symbol}**, setup: **{str(price_alert)}**, chart: `/fch {symbol.removesuffix('USDT')}`\n"
+            msg = msg + '\n' + await self.build_caption(f"https://www.binance.com/en/futures/{symbol}", symbol, ticker_24h)
+        msg = f"🔔 Price alert {self.config.TELEGRAM_ME}, list: **{', '.join([triggered[0] for triggered in list_triggered])}**\n\n" + msg
+        await bot.send_message(chat_id, text=telegramify_markdown.markdownify(msg), parse_mode=ParseMode.MARKDOWN_V2, link_preview_options=LinkPreviewOptions(is_disabled=True))
     
     async def f_get_stats(self, context: ContextTypes.DEFAULT_TYPE):
-        info, totalROI, pnl = self.info_future(True)
+        info, totalROI, pnl = await self.info_future(True)
         chat_id = self.config.TELEGRAM_PNL_CHAT_ID
         if info == "":
             remove_job_if_exists(JOB_NAME_FSTATS, context)
+            self.storage.delete_job(JOB_NAME_FSTATS)
             await context.bot.send_message(chat_id, telegramify_markdown.markdownify("👋 You don't have positions at this time!\nJob was removed, please command `/fstats` interval(seconds) when create a new position/order."), parse_mode=ParseMode.MARKDOWN_V2)
             return
         msg = ""
@@ -631,8 +810,8 @@ class Command:
                 chat_id=self.config.TELEGRAM_LOG_PEER_ID
             ), True)
 
-    def info_spot(self):
-        account_info = self.binance_api.get_account()
+    async def info_spot(self):
+        account_info = await self.binance_api.run(self.binance_api.get_account)
         total_balance = 0.0
         info = "**SPOT Account**\n"
         for balance in account_info["balances"]:
@@ -653,10 +832,9 @@ class Command:
         info += f"**Total balance**: {total_balance:.2f}"
         return info
     
-    def info_future(self, skip_info_when_no_positions: bool = False):
+    async def info_future(self, skip_info_when_no_positions: bool = False):
         info = "**Future Account**\n"
-        account_info = self.binance_api.get_futures_account()
-        positions = self.binance_api.get_current_position()
+        account_info, positions = await self.account_mirror.get_account()
         if skip_info_when_no_positions == True and len(positions) == 0:
             return ("", 0, 0)
         for position in positions:
@@ -688,65 +866,40 @@ class Command:
         info += f"**After Total Balance**: **${float(account_info['totalMarginBalance']):.2f}**"
         return (info, round(float(account_info['totalUnrealizedProfit']) / float(account_info['totalWalletBalance']) * 100, 2), round(float(account_info['totalUnrealizedProfit']), 2))
     
-    def f_get_orders(self, side: str, symbol: str, leverage: int, margin: float, context: ContextTypes.DEFAULT_TYPE):
-        price = self.binance_api.f_price(symbol)
-        pair_info = self.binance_api.f_get_symbol_info(symbol)
-        quantity_precision = int(pair_info['quantityPrecision']) if pair_info else 3
-        quantity = round(margin * leverage / price, quantity_precision)
+    async def f_get_symbol_rules(self, symbol: str) -> SymbolRules:
+        rules = self.order_builder.cached_rules(symbol)
+        if rules is None: # exchange info not loaded yet or new listing
+            rules = await self.binance_api.run(self.order_builder.get_rules, symbol)
+        return rules
+
+    async def f_get_orders(self, side: str, symbol: str, leverage: int, margin: float, context: ContextTypes.DEFAULT_TYPE):
+        rules = await self.f_get_symbol_rules(symbol)
+        price = self.order_builder.cached_price(symbol)
+        if price is None: # no live price, one rest read
+            price = Decimal(str(await self.binance_api.run(self.binance_api.f_price, symbol)))
         if 'b' in side:
             side_upper = "BUY"
         else:
             side_upper = "SELL"
-        order = {
-            "type": "MARKET",
-            "side": side_upper,
-            "symbol": symbol,
-            "quantity": str(quantity)
-        }
-        batch_orders = [order]
-        if len(context.args) > 4:
-            sl_order = {
-                "type": "STOP_MARKET",
-                "side": "BUY" if side_upper == "SELL" else "SELL",
-                "symbol": symbol,
-                "stopPrice": context.args[4],
-                "closePosition": "true"
-            }
-            batch_orders.append(sl_order)
-        if len(context.args) > 5:
-            tp_order = {
-                "type": "TAKE_PROFIT_MARKET",
-                "side": "BUY" if side_upper == "SELL" else "SELL",
-                "symbol": symbol,
-                "stopPrice": context.args[5],
-                "closePosition": "true"
-            }
-            batch_orders.append(tp_order)
-        return batch_orders
+        stop_loss = context.args[4] if len(context.args) > 4 else None
+        take_profit = context.args[5] if len(context.args) > 5 else None
+        return self.order_builder.market_orders(rules, side_upper, leverage, margin, price, stop_loss, take_profit)
     
-    def f_get_limit_order(self, side: str, symbol: str, leverage: int, margin: float, price: str):
-        pair_info = self.binance_api.f_get_symbol_info(symbol)
-        quantity_precision = int(pair_info['quantityPrecision']) if pair_info else 3
-        quantity = round(margin * leverage / float(price), quantity_precision)
+    async def f_get_limit_order(self, side: str, symbol: str, leverage: int, margin: float, price: str):
+        rules = await self.f_get_symbol_rules(symbol)
         if 'b' in side:
             side_upper = "BUY"
         else:
             side_upper = "SELL"
-        order = {
-            "symbol": symbol,
-            "side": side_upper,
-            "quantity": str(quantity),
-            "type": "LIMIT",
-            "timeInForce": "GTC",
-            "price": price,
-        }
-        return order
+        return self.order_builder.limit_order(rules, side_upper, leverage, margin, price)
 
-    def f_get_close_positions(self, symbol: str):
-        positions = self.binance_api.get_current_position(symbol=symbol)
+    async def f_get_close_positions(self, symbol: str | None = None): # all positions when symbol is None
+        positions = await self.account_mirror.get_positions(symbol)
         batch_orders = []
         for position in positions:
             amount = float(position["positionAmt"])
+            if amount == 0: # only open orders
+                continue
             if amount > 0:
                 side_upper = "BUY"
             else:
@@ -754,14 +907,16 @@ class Command:
             close_order = {
                 "type": "MARKET",
                 "side": "BUY" if side_upper == "SELL" else "SELL",
-                "symbol": symbol,
+                "symbol": position["symbol"],
                 "quantity": str(position["positionAmt"]).removeprefix('-'),
+                # quantity comes from the mirror, if the position shrank meanwhile (sl/tp filled) never open a reversed one
+                "reduceOnly": "true"
             }
             batch_orders.append(close_order)
         return batch_orders
     
-    def f_get_tp_sl_orders(self, symbol: str, context: ContextTypes.DEFAULT_TYPE):
-        positions = self.binance_api.get_current_position(symbol=symbol)
+    async def f_get_tp_sl_orders(self, symbol: str, context: ContextTypes.DEFAULT_TYPE):
+        positions = await self.account_mirror.get_positions(symbol)
         batch_orders = []
         for position in positions:
             amount = float(position["positionAmt"])
@@ -769,6 +924,7 @@ class Command:
                 side_upper = "BUY"
             else:
                 side_upper = "SELL"
+            # closePosition orders close whatever is left when triggered, binance rejects reduceOnly with them
             if len(context.args) > 1:
                 sl_order = {
                     "type": "STOP_MARKET",
@@ -789,30 +945,8 @@ class Command:
                 batch_orders.append(tp_order)
         return batch_orders
 
-    def generate_chart(self, type: str, symbol: str, data: list, interval: str):
-        for line in data:
-            del line[6:]
-            for i in range(1, len(line)):
-                line[i] = float(line[i])
-        df = pd.DataFrame(data, columns=['date', 'open', 'high', 'low', 'close', 'volume'])
-        df['date'] = pd.to_datetime(df['date'], unit='ms', utc=True).map(lambda x: x.tz_convert('Asia/Ho_Chi_Minh'))
-        df.set_index('date', inplace=True)
-        # Plotting
-        # Create my own `marketcolors` style:
-        mc = mpf.make_marketcolors(up='#2fc71e',down='#ed2f1a',inherit=True)
-        # Create my own `MatPlotFinance` style:
-        s  = mpf.make_mpf_style(base_mpl_style=['bmh', 'dark_background'], marketcolors=mc, y_on_right=True)    
-        # Plot it
-        buffer = io.BytesIO()
-        fig, axlist = mpf.plot(df, figratio=(10, 6), type="candle", tight_layout=True, ylabel = "Precio ($)", returnfig=True, volume=True, style=s)
-        # Add Title
-        axlist[0].set_title(f"{type} - {symbol} - {interval}", fontsize=25, style='italic')
-        fig.savefig(fname=buffer, dpi=300, bbox_inches="tight")
-        buffer.seek(0)
-        return buffer
-    
-    def build_caption(self, url: str, symbol: str, ticker_24h: dict):
-        pair_info = self.binance_api.f_get_symbol_info(symbol)
+    async def build_caption(self, url: str, symbol: str, ticker_24h: dict):
+        pair_info = await self.binance_api.run(self.binance_api.f_get_symbol_info, symbol)
         price_precision = int(pair_info['pricePrecision']) if pair_info else 4
         caption_msg = f"#{symbol}: [Link chart]({url})\n"
         caption_msg += f"⚡ {'Price': <8} **{round(float(ticker_24h['lastPrice']), price_precision)}**\n"
@@ -825,18 +959,79 @@ class Command:
     def f_stats(self, interval: int, context: ContextTypes.DEFAULT_TYPE):
         remove_job_if_exists(JOB_NAME_FSTATS, context)
         context.job_queue.run_repeating(self.f_get_stats, interval=interval, first=0, name=JOB_NAME_FSTATS)
+        self.storage.put_job(JOB_NAME_FSTATS, interval)
     
     def f_alert_track(self, interval: int, context: ContextTypes.DEFAULT_TYPE):
         remove_job_if_exists(JOB_NAME_FALERT_TRACK, context)
+        self.alert_tracking = True
         context.job_queue.run_repeating(self.f_get_alert_track, interval=interval, first=0, name=JOB_NAME_FALERT_TRACK)
+        self.storage.put_job(JOB_NAME_FALERT_TRACK, interval)
 
     def f_replies_track(self, interval: int, context: ContextTypes.DEFAULT_TYPE):
         remove_job_if_exists(JOB_NAME_FREPLIES_TRACK, context)
         context.job_queue.run_repeating(self.f_get_replies_track, interval=interval, first=0, name=JOB_NAME_FREPLIES_TRACK)
+        self.storage.put_job(JOB_NAME_FREPLIES_TRACK, interval)
+
+    # reload alerts, replies from storage and resume tracking jobs after restart
+    def f_restore(self, application: Application):
+        try:
+            alerts = self.storage.load_alerts()
+            replies = self.storage.load_replies()
+            jobs = self.storage.load_jobs()
+        except Exception as err: # locked/corrupt db, start with empty state
+            self.logger.error(Message(
+                title="Error Command.f_restore - storage is not readable, start without restored state",
+                body=f"Error: {err=}",
+                chat_id=self.config.TELEGRAM_LOG_PEER_ID
+            ), True)
+            return
+        list_error = [] # bad rows are skipped
+        for symbol, seq, op, price, gap in alerts:
+            try:
+                self.map_alert_price[symbol].add(PriceAlert(op, float(price), float(gap)), int(seq))
+            except Exception as err:
+                list_error.append(f"alert {symbol}:{seq}: {err=}")
+        for message_id, url, max_timestamp, min_timestamp, seen in replies:
+            try:
+                threads_reply = ThreadsReply(url, min_timestamp, self.config.THREADS_SEEN_LIMIT)
+                threads_reply.load_seen(seen)
+                threads_reply.max_timestamp = max(threads_reply.max_timestamp, max_timestamp)
+                self.map_tracking_replies[message_id] = threads_reply
+            except Exception as err:
+                list_error.append(f"reply {message_id}: {err=}")
+        callbacks = {
+            JOB_NAME_FSTATS: self.f_get_stats,
+            JOB_NAME_FALERT_TRACK: self.f_get_alert_track,
+            JOB_NAME_FREPLIES_TRACK: self.f_get_replies_track
+        }
+        for name, interval in jobs.items():
+            if name not in callbacks:
+                continue
+            try:
+                application.job_queue.run_repeating(callbacks[name], interval=interval, first=0, name=name)
+            except Exception as err:
+                list_error.append(f"job {name}: {err=}")
+                continue
+            if name == JOB_NAME_FALERT_TRACK:
+                self.alert_tracking = True
+        if len(list_error) > 0:
+            self.logger.error(Message(
+                title=f"Error Command.f_restore - {len(list_error)} rows skipped",
+                body="\n".join(list_error),
+                chat_id=self.config.TELEGRAM_LOG_PEER_ID
+            ), True)
+        self.logger.info(f"Restored {sum(len(alert_book) for alert_book in self.map_alert_price.values())} alerts, {len(self.map_tracking_replies)} replies, jobs: {list(jobs)}")
 
-    def f_set_leverage_and_margin_type(self, symbol: str, leverage: int = 10, margin_type: str = 'CROSSED'):
-        position_info = self.binance_api.get_position_info(symbol)[0]
-        if int(position_info["leverage"]) != leverage:
-            self.binance_api.f_change_leverage(symbol, leverage)
-        if (position_info["marginType"] == "cross" and margin_type != "CROSSED") or (position_info["marginType"] == "isolated" and margin_type != "ISOLATED"):
-            self.binance_api.f_change_margin_type(symbol, margin_type)
\ No newline at end of file
+    async def f_set_leverage_and_margin_type(self, symbol: str, leverage: int = 10, margin_type: str = 'CROSSED'):
+        # cached leverage/margin type, only changes need a request
+        symbol_config = self.binance_api.cached_symbol_config(symbol)
+        if symbol_config is None:
+            symbol_config = await self.binance_api.run(self.binance_api.f_symbol_config, symbol)
+        # margin type first, it fails when the symbol has open orders/position and then leverage must stay unchanged
+        if symbol_config["marginType"] != margin_type:
+            try:
+                await self.binance_api.run(self.binance_api.f_change_margin_type, symbol, margin_type)
+            except Exception as err:
+                raise ValueError(f"{symbol}: can't change margin type to {margin_type}, leverage is unchanged. {err}") from err
+        if int(symbol_config["leverage"]) != leverage:
+            await self.binance_api.run(self.binance_api.f_change_leverage, symbol, leverage)
\ No newline at end of file
@@ -25,7 +25,23 @@ class Config:
                 "nscriptiod_https": ""
             },
             "threads": {
-                "sla": 600
+                "sla": 600,
+                "seen_limit": 1000,
+                "concurrency": 2,
+                "timeout": 60,
+                "http_enabled": True,
+                "http_timeout": 10,
+                "browser_pool": 2
+            },
+            "storage": {
+                "path": "data/command_trade.db",
+                "flush_interval": 1
+            },
+            "chart": {
+                "dpi": 300,
+                "format": "png",
+                "workers": 2,
+                "cache_bytes": 16 * 1024 * 1024
             }
         }
         if os.path.exists("config/config_remote.yaml"):
@@ -38,15 +54,44 @@ class Config:
         self.TELEGRAM_GROUP_CHAT_ID = int(os.environ.get("TELEGRAM_GROUP_CHAT_ID") or config["telegram"]["group_chat_id"])
         self.TELEGRAM_ALERT_CHAT_ID = int(os.environ.get("TELEGRAM_ALERT_CHAT_ID") or config["telegram"]["alert_chat_id"])
         self.TELEGRAM_LOG_PEER_ID = int(os.environ.get("TELEGRAM_LOG_PEER_ID") or config["telegram"]["log_peer_id"])
+        self.TELEGRAM_WORKERS = int(os.environ.get("TELEGRAM_WORKERS") or config["telegram"].get("workers", 4))
+        self.TELEGRAM_GLOBAL_RATE = float(os.environ.get("TELEGRAM_GLOBAL_RATE") or config["telegram"].get("global_rate", 25))
+        self.TELEGRAM_CHAT_RATE = float(os.environ.get("TELEGRAM_CHAT_RATE") or config["telegram"].get("chat_rate", 1))
+        self.TELEGRAM_GROUP_RATE = float(os.environ.get("TELEGRAM_GROUP_RATE") or config["telegram"].get("group_rate", 0.33))
+        self.TELEGRAM_CHAT_BURST = float(os.environ.get("TELEGRAM_CHAT_BURST") or config["telegram"].get("chat_burst", 3))
+        self.TELEGRAM_COALESCE_WINDOW = float(os.environ.get("TELEGRAM_COALESCE_WINDOW") or config["telegram"].get("coalesce_window", 0.5))
+        self.TELEGRAM_MAX_RETRIES = int(os.environ.get("TELEGRAM_MAX_RETRIES") or config["telegram"].get("max_retries", 3))
+        self.TELEGRAM_IMAGE_MAX_BYTES = int(os.environ.get("TELEGRAM_IMAGE_MAX_BYTES") or config["telegram"].get("image_max_bytes", 10 * 1024 * 1024))
+        self.TELEGRAM_IMAGE_TIMEOUT = int(os.environ.get("TELEGRAM_IMAGE_TIMEOUT") or config["telegram"].get("image_timeout", 15))
+        self.TELEGRAM_FILE_ID_CACHE_SIZE = int(os.environ.get("TELEGRAM_FILE_ID_CACHE_SIZE") or config["telegram"].get("file_id_cache_size", 10000))
+        self.TELEGRAM_IMAGE_CACHE_BYTES = int(os.environ.get("TELEGRAM_IMAGE_CACHE_BYTES") or config["telegram"].get("image_cache_bytes", 32 * 1024 * 1024))
 
         self.BINANCE_API_KEY = os.environ.get("BINANCE_API_KEY") or config["binance"]["api_key"]
         self.BINANCE_API_SECRET = os.environ.get("BINANCE_API_SECRET") or config["binance"]["api_secret"]
         self.BINANCE_TLD = os.environ.get("BINANCE_TLD") or config["binance"]["tld"]
+        self.BINANCE_MAX_WORKERS = int(os.environ.get("BINANCE_MAX_WORKERS") or config.get("binance", {}).get("max_workers", 8))
+        self.BINANCE_EXCHANGE_INFO_TTL = int(os.environ.get("BINANCE_EXCHANGE_INFO_TTL") or config.get("binance", {}).get("exchange_info_ttl", 3600))
+        self.BINANCE_EXCHANGE_INFO_MIN_REFRESH = int(os.environ.get("BINANCE_EXCHANGE_INFO_MIN_REFRESH") or config.get("binance", {}).get("exchange_info_min_refresh", 60))
+        if "BINANCE_STREAM_ENABLED" in os.environ:
+            self.BINANCE_STREAM_ENABLED = os.environ.get("BINANCE_STREAM_ENABLED").lower() == "true"
+        else:
+            self.BINANCE_STREAM_ENABLED = config.get("binance", {}).get("stream_enabled", True)
+        self.BINANCE_STREAM_URL = os.environ.get("BINANCE_STREAM_URL") or config.get("binance", {}).get("stream_url", "wss://fstream.binance.com")
+        if "BINANCE_USER_STREAM_ENABLED" in os.environ:
+            self.BINANCE_USER_STREAM_ENABLED = os.environ.get("BINANCE_USER_STREAM_ENABLED").lower() == "true"
+        else:
+            self.BINANCE_USER_STREAM_ENABLED = config.get("binance", {}).get("user_stream_enabled", True)
+        self.BINANCE_LISTEN_KEY_KEEPALIVE = int(os.environ.get("BINANCE_LISTEN_KEY_KEEPALIVE") or config.get("binance", {}).get("listen_key_keepalive", 1800))
+        self.BINANCE_ACCOUNT_RESYNC = int(os.environ.get("BINANCE_ACCOUNT_RESYNC") or config.get("binance", {}).get("account_resync", 300))
+        self.BINANCE_TICKER_TTL = float(os.environ.get("BINANCE_TICKER_TTL") or config.get("binance", {}).get("ticker_ttl", 2))
+        self.BINANCE_KLINE_CACHE_BYTES = int(os.environ.get("BINANCE_KLINE_CACHE_BYTES") or config.get("binance", {}).get("kline_cache_bytes", 32 * 1024 * 1024))
+        self.BINANCE_STREAM_MAX_AGE = int(os.environ.get("BINANCE_STREAM_MAX_AGE") or config.get("binance", {}).get("stream_max_age", 10))
 
         if "COMMAND_ENABLED" in os.environ:
             self.COMMAND_ENABLED = os.environ.get("COMMAND_ENABLED").lower() == "true"
         else:
             self.COMMAND_ENABLED = config["command"]["enabled"]
+        self.INFO_TIMEOUT = float(os.environ.get("INFO_TIMEOUT") or config["command"].get("info_timeout", 10))
 
         self.PROXIES = {
             "http": os.environ.get(os.environ.get("HTTP_FIELD") or "HTTP_FIELD") or config["proxies"]["nscriptiod_http"],
@@ -54,6 +99,23 @@ class Config:
         }
 
         self.THREADS_SLA = int(os.environ.get("THREADS_SLA") or config["threads"]["sla"])
+        self.THREADS_SEEN_LIMIT = int(os.environ.get("THREADS_SEEN_LIMIT") or config["threads"].get("seen_limit", 1000))
+        self.THREADS_CONCURRENCY = int(os.environ.get("THREADS_CONCURRENCY") or config["threads"].get("concurrency", 2))
+        self.THREADS_TIMEOUT = int(os.environ.get("THREADS_TIMEOUT") or config["threads"].get("timeout", 60))
+        if "THREADS_HTTP_ENABLED" in os.environ:
+            self.THREADS_HTTP_ENABLED = os.environ.get("THREADS_HTTP_ENABLED").lower() == "true"
+        else:
+            self.THREADS_HTTP_ENABLED = config["threads"].get("http_enabled", True)
+        self.THREADS_HTTP_TIMEOUT = int(os.environ.get("THREADS_HTTP_TIMEOUT") or config["threads"].get("http_timeout", 10))
+        self.THREADS_BROWSER_POOL = int(os.environ.get("THREADS_BROWSER_POOL") or config["threads"].get("browser_pool", 2))
+
+        self.STORAGE_PATH = os.environ.get("STORAGE_PATH") or config.get("storage", {}).get("path", "data/command_trade.db")
+        self.STORAGE_FLUSH_INTERVAL = float(os.environ.get("STORAGE_FLUSH_INTERVAL") or config.get("storage", {}).get("flush_interval", 1))
+
+        self.CHART_DPI = int(os.environ.get("CHART_DPI") or config.get("chart", {}).get("dpi", 300))
+        self.CHART_FORMAT = os.environ.get("CHART_FORMAT") or config.get("chart", {}).get("format", "png")
+        self.CHART_WORKERS = int(os.environ.get("CHART_WORKERS") or config.get("chart", {}).get("workers", 2))
+        self.CHART_CACHE_BYTES = int(os.environ.get("CHART_CACHE_BYTES") or config.get("chart", {}).get("cache_bytes", 16 * 1024 * 1024))
     def beautify(self):
         response = vars(self).copy()
         response["platform"] = platform.system()
@@ -0,0 +1,62 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+
+import numpy as np
+
+class KlineStore:
+    """
+    Keep closed futures klines per (symbol, interval) in numpy buffers, columns: open_time, open, high, low, close, volume, close_time.
+    A repeated request only fetches the candles after the last closed one, a buffer only keeps the largest window requested for its key,
+    buffers are evicted LRU by memory budget.
+    """
+    COLUMNS = 7
+    def __init__(self, fetch: Callable[[str, str, int], list], max_bytes: int):
+        self.fetch = fetch # (symbol, interval, start_ms) -> raw klines from rest api
+        self.max_bytes = max_bytes
+        self.buffers: OrderedDict[tuple[str, str], np.ndarray] = OrderedDict()
+        self.windows: dict[tuple[str, str], float] = {} # largest requested window in ms per key
+        self.nbytes = 0
+        self.mutex = threading.Lock()
+
+    def get(self, symbol: str, interval: str, start_ms: int) -> np.ndarray:
+        key = (symbol, interval)
+        now_ms = time.time() * 1000
+        with self.mutex:
+            buffer = self.buffers.get(key)
+            if buffer is not None:
+                self.buffers.move_to_end(key)
+            # only keep the largest window requested for this key, older candles are never read again
+            window_ms = max(self.windows.get(key, 0), now_ms - start_ms)
+            self.windows[key] = window_ms
+        if buffer is not None and len(buffer) > 0 and buffer[0, 0] <= start_ms:
+            # next candle opens right after the close time of the last closed one
+            tail = self.to_array(self.fetch(symbol, interval, int(buffer[-1, 6]) + 1))
+            candles = np.concatenate((buffer, tail))
+        else:
+            candles = self.to_array(self.fetch(symbol, interval, start_ms))
+        # the last candle is still open, never keep it
+        self.put(key, candles[(candles[:, 6] < now_ms) & (candles[:, 0] >= now_ms - window_ms)])
+        return candles[candles[:, 0] >= start_ms]
+
+    def put(self, key: tuple[str, str], closed: np.ndarray):
+        with self.mutex:
+            old = self.buffers.pop(key, None)
+            if old is not None:
+                self.nbytes -= old.nbytes
+            if closed.nbytes > self.max_bytes:
+                # larger than the whole budget, drop the key instead of keeping its stale buffer
+                self.windows.pop(key, None)
+                return
+            self.buffers[key] = closed
+            self.nbytes += closed.nbytes
+            while self.nbytes > self.max_bytes:
+                evicted_key, evicted = self.buffers.popitem(last=False)
+                self.windows.pop(evicted_key, None)
+                self.nbytes -= evicted.nbytes
+
+    def to_array(self, klines: list) -> np.ndarray:
+        if len(klines) == 0:
+            return np.empty((0, self.COLUMNS), dtype=np.float64)
+        return np.asarray(klines)[:, :self.COLUMNS].astype(np.float64)
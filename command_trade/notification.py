@@ -1,15 +1,19 @@
+import hashlib
 import queue
 import threading
+import time
+from collections import OrderedDict
 from os import path
 
 import json
 from .config import Config
 import telegramify_markdown
 import telebot
-from telebot.types import LinkPreviewOptions, InputMediaPhoto, InputFile
+from telebot.types import LinkPreviewOptions, InputMediaPhoto
 from telebot import apihelper
 import datetime
 import requests
+from requests.adapters import HTTPAdapter
 class Message:
     def __init__(self, body: str, chat_id: int = 0, title = 'Command Trade', format: str | None = "MarkdownV2", image: str | None = None, images: list[str] | None = None, group_message_id: int | None = None):
         self.title = title
@@ -31,19 +35,127 @@ class Message:
         }
         return json.dumps(payload)
     def build_text_notify(self):
+        if self.title == "": # coalesced message, titles are in body
+            return self.body
         return f"**{self.title}**\n{self.body}"
 
+TELEGRAM_MESSAGE_LIMIT = 4096
+COALESCE_MARGIN = 256 # below limit - margin, the estimated length of a coalesced message is trusted
+
+class TokenBucket:
+    """
+    Thread-safe token bucket, acquire() blocks until a token is available
+    """
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate # tokens per second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds: float): # no token for next seconds, ex: telegram 429 retry_after
+        with self.lock:
+            self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+class FileIdCache:
+    """
+    Thread-safe LRU of telegram file_id by image url or content hash, an image already uploaded by the bot is sent by file_id
+    """
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.file_ids: OrderedDict[str, str] = OrderedDict()
+        self.mutex = threading.Lock()
+
+    @staticmethod
+    def content_key(image: bytes) -> str:
+        return "sha256:" + hashlib.sha256(image).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        with self.mutex:
+            file_id = self.file_ids.get(key)
+            if file_id is not None:
+                self.file_ids.move_to_end(key)
+            return file_id
+
+    def put(self, key: str, file_id: str):
+        with self.mutex:
+            self.file_ids[key] = file_id
+            self.file_ids.move_to_end(key)
+            while len(self.file_ids) > self.capacity:
+                self.file_ids.popitem(last=False)
+
+    def put_message(self, key: str, message) -> str | None: # file_id of the largest photo of a sent message
+        if message is None or not message.photo:
+            return None
+        file_id = message.photo[-1].file_id
+        self.put(key, file_id)
+        return file_id
+
 class NotificationHandler:
+    """
+    Deliver messages to telegram with a pool of workers. Messages of one chat always go to the same worker,
+    so they are never reordered. Each send waits for a token of its chat and of the global bucket,
+    and is retried on 429 (retry_after) and network errors.
+    """
     def __init__(self, cfg: Config, enabled=True):
         if enabled:
             self.config = cfg
-            self.queue = queue.Queue()
-            self.start_worker()
             self.enabled = True
+            # one pooled session shared by all workers (telebot uses apihelper.session when it is set)
+            apihelper.session = requests.Session()
+            apihelper.session.mount("https://", HTTPAdapter(pool_connections=cfg.TELEGRAM_WORKERS, pool_maxsize=cfg.TELEGRAM_WORKERS))
             self.telebot = telebot.TeleBot(token=cfg.TELEGRAM_BOT_TOKEN)
+            self.global_bucket = TokenBucket(cfg.TELEGRAM_GLOBAL_RATE, cfg.TELEGRAM_GLOBAL_RATE)
+            self.chat_buckets: dict[int, TokenBucket] = {}
+            self.chat_buckets_mutex = threading.Lock()
+            # fallback when telegram can't fetch an image url: download it in memory and upload the bytes
+            self.image_session = requests.Session()
+            self.image_session.mount("https://", HTTPAdapter(pool_connections=cfg.TELEGRAM_WORKERS, pool_maxsize=cfg.TELEGRAM_WORKERS))
+            self.image_cache: OrderedDict[str, bytes] = OrderedDict() # url -> image, LRU bounded by total bytes
+            self.image_cache_bytes = 0
+            self.image_cache_mutex = threading.Lock()
+            self.file_ids = FileIdCache(cfg.TELEGRAM_FILE_ID_CACHE_SIZE)
+            self.queues = [queue.Queue() for _ in range(cfg.TELEGRAM_WORKERS)]
+            self.start_worker()
         else:
             self.enabled = False
 
+    def chat_bucket(self, chat_id: int) -> TokenBucket:
+        with self.chat_buckets_mutex:
+            if chat_id not in self.chat_buckets:
+                # group/channel chat id is negative and has a lower limit than private chat
+                rate = self.config.TELEGRAM_GROUP_RATE if chat_id < 0 else self.config.TELEGRAM_CHAT_RATE
+                self.chat_buckets[chat_id] = TokenBucket(rate, self.config.TELEGRAM_CHAT_BURST)
+            return self.chat_buckets[chat_id]
+
+    def call(self, chat_id: int, func, **kwargs):
+        """Call telebot send method with rate limit, retry on 429 and network errors"""
+        for attempt in range(self.config.TELEGRAM_MAX_RETRIES + 1):
+            self.chat_bucket(chat_id).acquire()
+            self.global_bucket.acquire()
+            try:
+                return func(chat_id=chat_id, **kwargs)
+            except apihelper.ApiTelegramException as err:
+                if err.error_code != 429 or attempt == self.config.TELEGRAM_MAX_RETRIES:
+                    raise
+                retry_after = err.result_json.get("parameters", {}).get("retry_after", 2 ** attempt)
+                self.chat_bucket(chat_id).pause(retry_after)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt == self.config.TELEGRAM_MAX_RETRIES:
+                    raise
+                time.sleep(min(2 ** attempt, 30))
 
     def notify(self, message: Message):
         text_msg = message.build_text_notify()
@@ -52,21 +164,25 @@ class NotificationHandler:
         if message.images is not None and len(message.images) > 1:
             list_media = []
             for index, image in enumerate(message.images):
+                media = self.file_ids.get(image) or image
                 if index == 0:
                     list_media.append(InputMediaPhoto(
-                        media=image,
+                        media=media,
                         caption=text_msg,
                         parse_mode=message.format
                     ))
                 else:
-                    list_media.append(InputMediaPhoto(media=image))
+                    list_media.append(InputMediaPhoto(media=media))
             try:
-                self.telebot.send_media_group(chat_id = message.chat_id, media=list_media, reply_to_message_id=message.group_message_id)
+                sent_messages = self.call(message.chat_id, self.telebot.send_media_group, media=list_media, reply_to_message_id=message.group_message_id)
+                for image, sent_message in zip(message.images, sent_messages or []):
+                    self.file_ids.put_message(image, sent_message)
             except Exception as err:
-                self.telebot.send_message(chat_id = message.chat_id, text=text_msg + "\n" + f"Error send media group, err: {err}", parse_mode=message.format, link_preview_options=LinkPreviewOptions(is_disabled=True), reply_to_message_id=message.group_message_id)
+                self.call(message.chat_id, self.telebot.send_message, text=text_msg + "\n" + f"Error send media group, err: {err}", parse_mode=message.format, link_preview_options=LinkPreviewOptions(is_disabled=True), reply_to_message_id=message.group_message_id)
         elif message.image is not None and message.image != "":
             try:
-                self.telebot.send_photo(chat_id = message.chat_id, photo=message.image, caption = text_msg, parse_mode=message.format, reply_to_message_id=message.group_message_id)
+                sent_message = self.call(message.chat_id, self.telebot.send_photo, photo=self.file_ids.get(message.image) or message.image, caption = text_msg, parse_mode=message.format, reply_to_message_id=message.group_message_id)
+                self.file_ids.put_message(message.image, sent_message)
             except Exception as err:
                 print(datetime.datetime.now(), " - ERROR - ", Message(
                     title=f"Error Notification.send_photo, image={message.image}",
@@ -74,25 +190,140 @@ class NotificationHandler:
                     format=None,
                     chat_id=self.config.TELEGRAM_LOG_PEER_ID
                 ))
-                request = requests.get(message.image, stream=True)
-                with open("photo.png", "wb+") as file:
-                    for c in request:
-                        file.write(c)
-                self.telebot.send_photo(chat_id = message.chat_id, photo=InputFile("photo.png"), caption = text_msg, parse_mode=message.format, reply_to_message_id=message.group_message_id)
+                image = self.download_image(message.image)
+                # same content may come from another url (signed cdn urls), upload it only once
+                content_key = self.file_ids.content_key(image)
+                sent_message = self.call(message.chat_id, self.telebot.send_photo, photo=self.file_ids.get(content_key) or image, caption = text_msg, parse_mode=message.format, reply_to_message_id=message.group_message_id)
+                self.file_ids.put_message(content_key, sent_message)
+                self.file_ids.put_message(message.image, sent_message)
         else:
-            self.telebot.send_message(chat_id = message.chat_id, text=text_msg, parse_mode=message.format, link_preview_options=LinkPreviewOptions(is_disabled=True), reply_to_message_id=message.group_message_id)
+            self.call(message.chat_id, self.telebot.send_message, text=text_msg, parse_mode=message.format, link_preview_options=LinkPreviewOptions(is_disabled=True), reply_to_message_id=message.group_message_id)
+
+    def download_image(self, url: str) -> bytes:
+        with self.image_cache_mutex:
+            if url in self.image_cache:
+                self.image_cache.move_to_end(url)
+                return self.image_cache[url]
+        max_bytes = self.config.TELEGRAM_IMAGE_MAX_BYTES
+        with self.image_session.get(url, stream=True, timeout=self.config.TELEGRAM_IMAGE_TIMEOUT) as response:
+            response.raise_for_status()
+            if int(response.headers.get("Content-Length") or 0) > max_bytes:
+                raise ValueError(f"image is larger than {max_bytes} bytes, url={url}")
+            buffer = bytearray()
+            for chunk in response.iter_content(chunk_size=65536):
+                buffer.extend(chunk)
+                if len(buffer) > max_bytes:
+                    raise ValueError(f"image is larger than {max_bytes} bytes, url={url}")
+        image = bytes(buffer)
+        with self.image_cache_mutex:
+            if url not in self.image_cache:
+                self.image_cache[url] = image
+                self.image_cache_bytes += len(image)
+            while self.image_cache_bytes > self.config.TELEGRAM_IMAGE_CACHE_BYTES:
+                _, removed = self.image_cache.popitem(last=False)
+                self.image_cache_bytes -= len(removed)
+        return image
 
     def start_worker(self):
-        threading.Thread(target=self.process_queue, daemon=True).start()
+        for worker_queue in self.queues:
+            threading.Thread(target=self.process_queue, args=(worker_queue,), daemon=True).start()
 
-    def process_queue(self):
+    def process_queue(self, worker_queue: queue.Queue):
         while True:
-            # message, attachments = self.queue.get()
-            message = self.queue.get()
-            self.notify(message)
-            self.queue.task_done()
+            batch = [worker_queue.get()]
+            # wait a short window to coalesce bursty messages
+            deadline = time.monotonic() + self.config.TELEGRAM_COALESCE_WINDOW
+            while True:
+                try:
+                    batch.append(worker_queue.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            for message in self.coalesce(batch):
+                try:
+                    self.notify(message)
+                except Exception as err:
+                    print(datetime.datetime.now(), " - ERROR - ", Message(
+                        title=f"Error NotificationHandler.notify, message={message}",
+                        body=f"Error: {err=}",
+                        format=None,
+                        chat_id=self.config.TELEGRAM_LOG_PEER_ID
+                    ))
+            for _ in batch:
+                worker_queue.task_done()
+
+    def is_text_only(self, message: Message) -> bool: # same condition as notify sending by send_message
+        return not (message.images is not None and len(message.images) > 1) and (message.image is None or message.image == "")
+
+    def text_length(self, message: Message) -> int:
+        text_msg = message.build_text_notify()
+        if message.format is not None:
+            text_msg = telegramify_markdown.markdownify(text_msg)
+        return len(text_msg)
+
+    def entry_length(self, message: Message, count: int) -> int: # length of one entry of a coalesced message
+        return self.text_length(Message(body=self.build_entry(message.title, message.body, count), title="", format=message.format))
+
+    def fits(self, group: dict) -> bool:
+        # sum of entry lengths is close to the merged length, measure the merged text only near the limit
+        entries = group["entries"]
+        if sum(length for _, _, length in entries) + 2 * (len(entries) - 1) <= TELEGRAM_MESSAGE_LIMIT - COALESCE_MARGIN:
+            return True
+        return self.text_length(self.build_coalesced(group)) <= TELEGRAM_MESSAGE_LIMIT
+
+    def coalesce(self, messages: list[Message]) -> list[Message]:
+        """
+        Merge text-only messages of the same chat (same format and reply) into one message up to the telegram limit,
+        adjacent identical messages are collapsed into one with a count. Order of messages inside a chat is kept.
+        """
+        result: list[Message | dict] = []
+        open_groups: dict[int, dict] = {} # chat_id -> group can still be merged into
+        for message in messages:
+            if not self.is_text_only(message):
+                open_groups.pop(message.chat_id, None)
+                result.append(message)
+                continue
+            group = open_groups.get(message.chat_id)
+            if group is not None and group["format"] == message.format and group["group_message_id"] == message.group_message_id:
+                entries = group["entries"]
+                last = entries[-1]
+                last_message, count, length = last
+                if last_message.title == message.title and last_message.body == message.body:
+                    entries[-1] = [last_message, count + 1, length]
+                    if count > 1 and len(str(count + 1)) == len(str(count)): # same merged length, it still fits
+                        continue
+                    # count suffix and its escaping change the length
+                    entries[-1][2] = self.entry_length(message, count + 1)
+                    if self.fits(group):
+                        continue
+                    entries[-1] = last
+                else:
+                    entries.append([message, 1, self.entry_length(message, 1)])
+                    if self.fits(group):
+                        continue
+                    entries.pop()
+            # first message of the chat, other format/reply, or merged text (counts and escaping included) over the limit
+            group = {
+                "message": message,
+                "format": message.format,
+                "group_message_id": message.group_message_id,
+                "entries": [[message, 1, self.entry_length(message, 1)]] # [message, count, length of entry], in order received
+            }
+            open_groups[message.chat_id] = group
+            result.append(group)
+        return [self.build_coalesced(item) if isinstance(item, dict) else item for item in result]
+
+    @staticmethod
+    def build_entry(title: str, body: str, count: int) -> str:
+        return f"**{title}**{f' (x{count})' if count > 1 else ''}\n{body}"
+
+    def build_coalesced(self, group: dict) -> Message:
+        message = group["message"]
+        if len(group["entries"]) == 1 and group["entries"][0][1] == 1:
+            return message
+        list_text = [self.build_entry(entry.title, entry.body, count) for entry, count, _ in group["entries"]]
+        return Message(body="\n\n".join(list_text), chat_id=message.chat_id, title="", format=message.format, group_message_id=message.group_message_id)
 
     def send_notification(self, message: Message, attachments=None):
         if self.enabled:
-            self.queue.put(message)
-            # self.queue.put((message, attachments or []))
+            # same chat -> same worker, keep order of messages inside one chat
+            self.queues[hash(message.chat_id) % len(self.queues)].put(message)
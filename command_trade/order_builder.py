@@ -0,0 +1,125 @@
+from decimal import Decimal, InvalidOperation, ROUND_DOWN, ROUND_HALF_UP
+from typing import Dict
+
+from .binance_api import BinanceAPI
+from .stream import PriceStream
+
+class SymbolRules:
+    """
+    Order filters of a futures symbol from exchange info (LOT_SIZE, MARKET_LOT_SIZE, PRICE_FILTER, MIN_NOTIONAL),
+    quantities are floored to the step size so an order never needs more margin than asked
+    """
+    def __init__(self, info: dict):
+        self.symbol = info["symbol"]
+        filters = {f["filterType"]: f for f in info.get("filters", [])}
+        lot_size = filters.get("LOT_SIZE", {})
+        market_lot_size = filters.get("MARKET_LOT_SIZE", lot_size)
+        default_step = str(Decimal(1).scaleb(-int(info.get("quantityPrecision", 3))))
+        self.step_size = Decimal(lot_size.get("stepSize", default_step)).normalize()
+        self.min_qty = Decimal(lot_size.get("minQty", "0"))
+        self.max_qty = Decimal(lot_size.get("maxQty", "0"))
+        self.market_step_size = Decimal(market_lot_size.get("stepSize", default_step)).normalize()
+        self.market_min_qty = Decimal(market_lot_size.get("minQty", "0"))
+        self.market_max_qty = Decimal(market_lot_size.get("maxQty", "0"))
+        self.tick_size = Decimal(filters.get("PRICE_FILTER", {}).get("tickSize", str(Decimal(1).scaleb(-int(info.get("pricePrecision", 4)))))).normalize()
+        self.min_notional = Decimal(filters.get("MIN_NOTIONAL", {}).get("notional", "0"))
+
+    def to_decimal(self, name: str, value: str | float | Decimal) -> Decimal: # user input, ValueError with a readable message instead of InvalidOperation
+        try:
+            result = Decimal(str(value).strip())
+        except InvalidOperation:
+            raise ValueError(f"{self.symbol}: {name} {value!r} is not a number") from None
+        if not result.is_finite() or result <= 0:
+            raise ValueError(f"{self.symbol}: {name} {value!r} must be a positive number")
+        return result
+
+    @staticmethod
+    def floor(value: Decimal, step: Decimal) -> Decimal:
+        return ((value / step).to_integral_value(rounding=ROUND_DOWN) * step).quantize(step)
+
+    def quantity(self, margin: float, leverage: int, price: Decimal, market: bool = True) -> str:
+        step_size, min_qty, max_qty = (self.market_step_size, self.market_min_qty, self.market_max_qty) if market else (self.step_size, self.min_qty, self.max_qty)
+        quantity = self.floor(self.to_decimal("margin", margin) * leverage / self.to_decimal("price", price), step_size)
+        if quantity < min_qty or quantity <= 0:
+            raise ValueError(f"{self.symbol}: quantity {quantity} is less than min quantity {min_qty}")
+        if max_qty > 0 and quantity > max_qty:
+            raise ValueError(f"{self.symbol}: quantity {quantity} is greater than max quantity {max_qty}")
+        if quantity * price < self.min_notional:
+            raise ValueError(f"{self.symbol}: notional {quantity * price:f} is less than min notional {self.min_notional}")
+        return f"{quantity:f}"
+
+    def price(self, price: str | Decimal) -> str:
+        return f"{(self.to_decimal('price', price) / self.tick_size).to_integral_value(rounding=ROUND_HALF_UP) * self.tick_size:f}"
+
+class OrderBuilder:
+    """
+    Build valid futures orders without rest reads: symbol rules are precomputed from the cached exchange info,
+    price is taken from the price stream or the ticker snapshot
+    """
+    def __init__(self, binance_api: BinanceAPI, price_stream: PriceStream):
+        self.binance_api = binance_api
+        self.price_stream = price_stream
+        self.rules: Dict[str, tuple[dict, SymbolRules]] = {} # symbol -> (exchange info used, rules)
+
+    def build_rules(self, info: dict) -> SymbolRules:
+        cached = self.rules.get(info["symbol"])
+        if cached is not None and cached[0] is info: # exchange info not refreshed since
+            return cached[1]
+        rules = SymbolRules(info)
+        self.rules[info["symbol"]] = (info, rules)
+        return rules
+
+    def cached_rules(self, symbol: str) -> SymbolRules | None:
+        with self.binance_api.cache.open_symbols() as symbols:
+            info = symbols.get(symbol)
+        return self.build_rules(info) if info is not None else None
+
+    def get_rules(self, symbol: str) -> SymbolRules: # blocking, may refresh exchange info for an unknown symbol
+        info = self.binance_api.f_get_symbol_info(symbol)
+        if info is None:
+            raise ValueError(f"{symbol}: unknown futures symbol")
+        return self.build_rules(info)
+
+    def cached_price(self, symbol: str) -> Decimal | None: # None when no recent price of the symbol, caller reads rest api
+        ticker = self.price_stream.get_fresh_ticker(symbol) or self.binance_api.cached_ticker(symbol)
+        return Decimal(ticker["lastPrice"]) if ticker is not None else None
+
+    def market_orders(self, rules: SymbolRules, side: str, leverage: int, margin: float, price: Decimal, stop_loss: str | None = None, take_profit: str | None = None) -> list[dict]:
+        """
+        Market order with optional stop loss/take profit closing the position, in one batch
+        """
+        close_side = "BUY" if side == "SELL" else "SELL"
+        batch_orders = [{
+            "type": "MARKET",
+            "side": side,
+            "symbol": rules.symbol,
+            "quantity": rules.quantity(margin, leverage, price)
+        }]
+        if stop_loss is not None:
+            batch_orders.append({
+                "type": "STOP_MARKET",
+                "side": close_side,
+                "symbol": rules.symbol,
+                "stopPrice": rules.price(stop_loss),
+                "closePosition": "true"
+            })
+        if take_profit is not None:
+            batch_orders.append({
+                "type": "TAKE_PROFIT_MARKET",
+                "side": close_side,
+                "symbol": rules.symbol,
+                "stopPrice": rules.price(take_profit),
+                "closePosition": "true"
+            })
+        return batch_orders
+
+    def limit_order(self, rules: SymbolRules, side: str, leverage: int, margin: float, price: str) -> dict:
+        limit_price = rules.price(price)
+        return {
+            "symbol": rules.symbol,
+            "side": side,
+            "quantity": rules.quantity(margin, leverage, Decimal(limit_price), market=False),
+            "type": "LIMIT",
+            "timeInForce": "GTC",
+            "price": limit_price,
+        }
@@ -5,6 +5,10 @@ from .notification import Message
 from .binance_api import BinanceAPI
 from .command import Command
 from .threads import Threads
+from .stream import PriceStream, UserDataStream
+from .account import AccountMirror
+from .storage import Storage
+from .chart import ChartPool
 from telegram.ext import Application, CommandHandler, MessageHandler, filters
 from telegram import Update
 
@@ -13,9 +17,14 @@ def main():
     logger = Logger(config, "command_trade_server")
     binanceAPI = BinanceAPI(config, logger)
     threads = Threads(config, logger)
-    command = Command(config, logger, binance_api=binanceAPI, threads=threads)
+    priceStream = PriceStream(config, logger)
+    userStream = UserDataStream(config, logger, binanceAPI)
+    accountMirror = AccountMirror(config, logger, binanceAPI, priceStream, userStream)
+    storage = Storage(config, logger)
+    chartPool = ChartPool(config, logger)
+    command = Command(config, logger, binance_api=binanceAPI, threads=threads, price_stream=priceStream, storage=storage, chart_pool=chartPool, user_stream=userStream, account_mirror=accountMirror)
     if config.COMMAND_ENABLED == True:
-        application = Application.builder().token(config.TELEGRAM_BOT_TOKEN).read_timeout(7).get_updates_read_timeout(42).post_init(command.post_init).build()
+        application = Application.builder().token(config.TELEGRAM_BOT_TOKEN).concurrent_updates(True).read_timeout(7).get_updates_read_timeout(42).post_init(command.post_init).post_shutdown(command.post_shutdown).build()
         application.add_handler(CommandHandler("help", command.help))
         application.add_handler(CommandHandler("start", command.start))
         application.add_handler(CommandHandler("info", command.info))
@@ -0,0 +1,127 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from .logger import Logger
+from .config import Config
+from .notification import Message
+
+class Storage:
+    """
+    Persist alerts, threads reply trackers and tracking jobs in sqlite (WAL mode), reload them after restart.
+    Writes are queued and committed in batch by a background thread, so callers never wait on disk.
+    """
+    MAX_BATCH = 500
+    def __init__(self, config: Config, logger: Logger):
+        self.config = config
+        self.logger = logger
+        self.path = config.STORAGE_PATH
+        if os.path.dirname(self.path) != "":
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = self.connect()
+        with conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS alerts (symbol TEXT, seq INTEGER, op TEXT, price REAL, gap REAL, PRIMARY KEY (symbol, seq))")
+            conn.execute("CREATE TABLE IF NOT EXISTS replies (message_id TEXT PRIMARY KEY, url TEXT, max_timestamp INTEGER, min_timestamp INTEGER, seen TEXT)")
+            columns = [column[1] for column in conn.execute("PRAGMA table_info(replies)")]
+            if "seen" not in columns: # db created before seen reply index
+                conn.execute("ALTER TABLE replies ADD COLUMN min_timestamp INTEGER")
+                conn.execute("ALTER TABLE replies ADD COLUMN seen TEXT")
+                conn.execute("UPDATE replies SET min_timestamp = max_timestamp, seen = '[]'")
+            conn.execute("CREATE TABLE IF NOT EXISTS jobs (name TEXT PRIMARY KEY, interval INTEGER)")
+        conn.close()
+        self.queue = queue.Queue()
+        self.worker = threading.Thread(target=self.process_queue, daemon=True)
+        self.worker.start()
+
+    def connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL") # WAL + NORMAL is still crash-safe, only fsync at checkpoint
+        return conn
+
+    def query(self, sql: str):
+        conn = self.connect()
+        try:
+            return conn.execute(sql).fetchall()
+        finally:
+            conn.close()
+
+    # load at startup
+    def load_alerts(self) -> list[tuple[str, int, str, float, float]]: # (symbol, seq, op, price, gap)
+        return self.query("SELECT symbol, seq, op, price, gap FROM alerts ORDER BY symbol, seq")
+
+    def load_replies(self) -> list[tuple[str, str, int, int, str]]: # (message_id, url, max_timestamp, min_timestamp, seen)
+        return self.query("SELECT message_id, url, max_timestamp, min_timestamp, seen FROM replies")
+
+    def load_jobs(self) -> dict[str, int]: # name -> interval(seconds)
+        return dict(self.query("SELECT name, interval FROM jobs"))
+
+    # write, non blocking
+    def put_alert(self, symbol: str, seq: int, op: str, price: float, gap: float):
+        self.execute("INSERT OR REPLACE INTO alerts (symbol, seq, op, price, gap) VALUES (?, ?, ?, ?, ?)", (symbol, seq, op, price, gap))
+
+    def delete_alert(self, symbol: str, seq: int):
+        self.execute("DELETE FROM alerts WHERE symbol = ? AND seq = ?", (symbol, seq))
+
+    def delete_alerts(self, symbol: str | None = None): # all alerts when symbol is None
+        if symbol is None:
+            self.execute("DELETE FROM alerts")
+        else:
+            self.execute("DELETE FROM alerts WHERE symbol = ?", (symbol,))
+
+    def put_reply(self, message_id: str, threads_reply):
+        self.execute(
+            "INSERT OR REPLACE INTO replies (message_id, url, max_timestamp, min_timestamp, seen) VALUES (?, ?, ?, ?, ?)",
+            (message_id, threads_reply.url, threads_reply.max_timestamp, threads_reply.min_timestamp, threads_reply.dump_seen())
+        )
+
+    def delete_replies(self, message_id: str | None = None): # all replies when message_id is None
+        if message_id is None:
+            self.execute("DELETE FROM replies")
+        else:
+            self.execute("DELETE FROM replies WHERE message_id = ?", (message_id,))
+
+    def put_job(self, name: str, interval: int):
+        self.execute("INSERT OR REPLACE INTO jobs (name, interval) VALUES (?, ?)", (name, interval))
+
+    def delete_job(self, name: str):
+        self.execute("DELETE FROM jobs WHERE name = ?", (name,))
+
+    def execute(self, sql: str, params: tuple = ()):
+        self.queue.put((sql, params))
+
+    def process_queue(self):
+        conn = self.connect()
+        while True:
+            item = self.queue.get()
+            batch = [item]
+            # wait a bit to group all writes of one command/tracking loop into one transaction
+            deadline = time.time() + self.config.STORAGE_FLUSH_INTERVAL
+            while item is not None and len(batch) < self.MAX_BATCH:
+                try:
+                    item = self.queue.get(timeout=max(0, deadline - time.time()))
+                    batch.append(item)
+                except queue.Empty:
+                    break
+            try:
+                with conn:
+                    for item in batch:
+                        if item is not None:
+                            conn.execute(item[0], item[1])
+            except Exception as err:
+                self.logger.error(Message(
+                    title=f"Error Storage.process_queue - {len(batch)} writes",
+                    body=f"Error: {err=}",
+                    chat_id=self.config.TELEGRAM_LOG_PEER_ID
+                ), True)
+            for _ in batch:
+                self.queue.task_done()
+            if batch[-1] is None:
+                conn.close()
+                return
+
+    def close(self): # flush all pending writes
+        self.queue.put(None)
+        self.worker.join(timeout=10)
@@ -0,0 +1,237 @@
+import abc
+import asyncio
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+import websockets
+from .logger import Logger
+from .config import Config
+from .notification import Message
+from .binance_api import BinanceAPI
+
+class WebsocketStream(abc.ABC):
+    """
+    Base websocket consumer, keep the connection alive and reconnect with backoff when it drops.
+    Updates are handed to listeners through a bounded queue drained by its own task, so the receive loop
+    never waits for a slow listener (telegram, rest api).
+    """
+    MAX_BACKOFF = 60
+    QUEUE_SIZE = 1000
+    def __init__(self, config: Config, logger: Logger, name: str):
+        self.config = config
+        self.logger = logger
+        self.name = name
+        self.task: asyncio.Task | None = None
+        self.dispatch_task: asyncio.Task | None = None
+        self.connected = False
+        self.last_message_at = 0.0
+        self.listeners: list[Callable[[Any], Awaitable[None]]] = []
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=self.QUEUE_SIZE)
+
+    @abc.abstractmethod
+    async def get_url(self) -> str:
+        ...
+
+    @abc.abstractmethod
+    async def on_message(self, data: dict):
+        ...
+
+    def add_listener(self, listener: Callable[[Any], Awaitable[None]]):
+        self.listeners.append(listener)
+
+    def publish(self, update): # called from the receive loop, never blocks
+        try:
+            self.queue.put_nowait(update)
+        except asyncio.QueueFull:
+            self.queue.get_nowait() # listeners are too slow, drop the oldest update
+            self.queue.put_nowait(update)
+            self.on_overflow()
+
+    def on_overflow(self):
+        self.logger.error(Message(
+            title=f"Error {self.name}.publish - listeners too slow",
+            body=f"Queue is full ({self.QUEUE_SIZE}), oldest update dropped",
+            chat_id=self.config.TELEGRAM_LOG_PEER_ID
+        ), True)
+
+    async def next_update(self):
+        return await self.queue.get()
+
+    async def dispatch(self):
+        while True:
+            update = await self.next_update()
+            for listener in self.listeners:
+                try:
+                    await listener(update)
+                except Exception as err:
+                    self.logger.error(Message(
+                        title=f"Error {self.name}.dispatch - listener {listener.__qualname__}",
+                        body=f"Error: {err=}",
+                        chat_id=self.config.TELEGRAM_LOG_PEER_ID
+                    ), True)
+
+    def start(self): # must be called inside the running event loop
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run(), name=self.name)
+        if self.dispatch_task is None or self.dispatch_task.done():
+            self.dispatch_task = asyncio.create_task(self.dispatch(), name=f"{self.name}.dispatch")
+
+    async def stop(self):
+        for task in (self.task, self.dispatch_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self.task = None
+        self.dispatch_task = None
+
+    def is_alive(self) -> bool:
+        return self.connected and time.time() - self.last_message_at <= self.config.BINANCE_STREAM_MAX_AGE
+
+    async def run(self):
+        backoff = 1
+        while True:
+            try:
+                async with websockets.connect(await self.get_url(), max_size=2**22) as ws:
+                    self.connected = True
+                    backoff = 1
+                    async for raw in ws:
+                        self.last_message_at = time.time()
+                        await self.on_message(json.loads(raw))
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                self.logger.error(Message(
+                    title=f"Error {self.name}.run, reconnect after {backoff}s",
+                    body=f"Error: {err=}",
+                    chat_id=self.config.TELEGRAM_LOG_PEER_ID
+                ), True)
+            finally:
+                self.connected = False
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, self.MAX_BACKOFF)
+
+class PriceStream(WebsocketStream):
+    """
+    Futures market streams !ticker@arr and !markPrice@arr, keep the last 24hr ticker/mark price of all symbols in memory
+    """
+    STREAMS = ["!ticker@arr", "!markPrice@arr@1s"]
+    def __init__(self, config: Config, logger: Logger):
+        super().__init__(config, logger, "PriceStream")
+        self.tickers: Dict[str, dict] = {} # same fields as rest api futures_ticker
+        self.mark_prices: Dict[str, float] = {}
+        self.received_at: Dict[str, float] = {} # symbol -> time of last ticker, !ticker@arr only carries changed symbols
+        self.pending: Dict[str, dict] = {} # tickers updated since listeners last ran, bounded by the number of symbols
+        self.pending_event = asyncio.Event()
+
+    def publish(self, update: Dict[str, dict]): # coalesce instead of queueing, listeners get the last ticker of each symbol
+        self.pending.update(update)
+        self.pending_event.set()
+
+    async def next_update(self) -> Dict[str, dict]: # listener(tickers updated)
+        await self.pending_event.wait()
+        self.pending_event.clear()
+        update, self.pending = self.pending, {}
+        return update
+
+    async def get_url(self) -> str:
+        return f"{self.config.BINANCE_STREAM_URL}/stream?streams={'/'.join(self.STREAMS)}"
+
+    def get_ticker(self, symbol: str) -> dict | None:
+        if not self.is_alive():
+            return None
+        return self.tickers.get(symbol)
+
+    def get_fresh_ticker(self, symbol: str) -> dict | None: # ticker of the symbol itself received less than BINANCE_STREAM_MAX_AGE ago
+        if time.time() - self.received_at.get(symbol, 0) > self.config.BINANCE_STREAM_MAX_AGE:
+            return None
+        return self.get_ticker(symbol)
+
+    def get_mark_price(self, symbol: str) -> float | None:
+        if not self.is_alive():
+            return None
+        return self.mark_prices.get(symbol)
+
+    async def on_message(self, data: dict):
+        stream = data.get("stream", "")
+        events = data.get("data", [])
+        if stream.startswith("!markPrice"):
+            for event in events:
+                self.mark_prices[event["s"]] = float(event["p"])
+            return
+        updated = {}
+        now = time.time()
+        for event in events:
+            ticker = {
+                "symbol": event["s"],
+                "priceChange": event["p"],
+                "priceChangePercent": event["P"],
+                "lastPrice": event["c"],
+                "openPrice": event["o"],
+                "highPrice": event["h"],
+                "lowPrice": event["l"],
+                "volume": event["v"],
+                "quoteVolume": event["q"],
+                "closeTime": event["C"]
+            }
+            self.tickers[event["s"]] = ticker
+            self.received_at[event["s"]] = now
+            updated[event["s"]] = ticker
+        self.publish(updated)
+
+class UserDataStream(WebsocketStream):
+    """
+    Futures user data stream (ACCOUNT_UPDATE, ORDER_TRADE_UPDATE, ACCOUNT_CONFIG_UPDATE), a new listen key is created
+    on each connection and kept alive in background. Events are passed to listeners as received.
+    """
+    def __init__(self, config: Config, logger: Logger, binance_api: BinanceAPI):
+        super().__init__(config, logger, "UserDataStream")
+        self.binance_api = binance_api
+        self.listen_key: str | None = None
+        self.connections = 0 # increased on each (re)connection or dropped event, events may be missed in between
+        self.keepalive_task: asyncio.Task | None = None
+
+    def on_overflow(self): # a dropped event is a gap, same as a reconnection for listeners
+        super().on_overflow()
+        self.connections += 1
+
+    def start(self):
+        super().start()
+        if self.keepalive_task is None or self.keepalive_task.done():
+            self.keepalive_task = asyncio.create_task(self.keepalive(), name=f"{self.name}.keepalive")
+
+    async def stop(self):
+        if self.keepalive_task is not None:
+            self.keepalive_task.cancel()
+            self.keepalive_task = None
+        await super().stop()
+
+    def is_alive(self) -> bool: # no message for a long time is normal when the account does not change
+        return self.connected
+
+    async def get_url(self) -> str:
+        self.connections += 1
+        self.listen_key = await self.binance_api.run(self.binance_api.f_listen_key)
+        return f"{self.config.BINANCE_STREAM_URL}/ws/{self.listen_key}"
+
+    async def keepalive(self): # listen key expires after 60 minutes without keepalive
+        while True:
+            await asyncio.sleep(self.config.BINANCE_LISTEN_KEY_KEEPALIVE)
+            if self.listen_key is None:
+                continue
+            try:
+                await self.binance_api.run(self.binance_api.f_keepalive_listen_key, self.listen_key)
+            except Exception as err:
+                self.logger.error(Message(
+                    title=f"Error {self.name}.keepalive",
+                    body=f"Error: {err=}",
+                    chat_id=self.config.TELEGRAM_LOG_PEER_ID
+                ), True)
+
+    async def on_message(self, data: dict): # listener(event), in order received
+        self.publish(data)
+        if data.get("e") == "listenKeyExpired": # reconnect with a new listen key
+            raise ConnectionError("listen key expired")
@@ -1,11 +1,14 @@
 import json
 import time
+import asyncio
+from contextlib import asynccontextmanager
 from typing import Dict
 
-import jmespath
 from parsel import Selector
-from playwright.async_api import async_playwright
+from playwright.async_api import async_playwright, Playwright, Browser, Page
 from nested_lookup import nested_lookup
+import requests
+from requests.adapters import HTTPAdapter
 from .logger import Logger
 from .config import Config
 from .notification import Message
@@ -15,6 +18,72 @@ import subprocess
 import sys
 import re
 
+def get_path(value, *keys): # same as jmespath field access, None when a key is missing or value is not an object
+    for key in keys:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+def extract_thread(data: Dict) -> Dict:
+    """
+    Reduce a thread item to the most important fields, same result as the jmespath expression
+    {text: post.caption.text, published_on: post.taken_at, id: post.id, pk: post.pk, code: post.code,
+    username: post.user.username, user_pic: post.user.profile_pic_url, user_verified: post.user.is_verified,
+    user_pk: post.user.pk, user_id: post.user.id, has_audio: post.has_audio, reply_count: view_replies_cta_string,
+    like_count: post.like_count, images: post.image_versions2.candidates[0].url, image_count: post.carousel_media_count,
+    videos: post.video_versions[].url}
+    but with plain dict lookups instead of walking the jmespath AST for every reply
+    """
+    post = get_path(data, "post")
+    user = get_path(post, "user")
+    candidates = get_path(post, "image_versions2", "candidates")
+    videos = get_path(post, "video_versions")
+    return {
+        "text": get_path(post, "caption", "text"),
+        "published_on": get_path(post, "taken_at"),
+        "id": get_path(post, "id"),
+        "pk": get_path(post, "pk"),
+        "code": get_path(post, "code"),
+        "username": get_path(user, "username"),
+        "user_pic": get_path(user, "profile_pic_url"),
+        "user_verified": get_path(user, "is_verified"),
+        "user_pk": get_path(user, "pk"),
+        "user_id": get_path(user, "id"),
+        "has_audio": get_path(post, "has_audio"),
+        "reply_count": get_path(data, "view_replies_cta_string"),
+        "like_count": get_path(post, "like_count"),
+        "images": get_path(candidates[0], "url") if isinstance(candidates, list) and len(candidates) > 0 else None,
+        "image_count": get_path(post, "carousel_media_count"),
+        "videos": [url for url in (get_path(video, "url") for video in videos) if url is not None] if isinstance(videos, list) else None
+    }
+
+THREAD_ITEMS_KEY = '"thread_items"'
+JSON_DECODER = json.JSONDecoder()
+
+def find_thread_items(dataset: str) -> list:
+    """
+    Decode only the values of "thread_items" keys from the raw dataset text,
+    instead of json.loads the whole dataset and walking it with nested_lookup
+    """
+    thread_items = []
+    idx = dataset.find(THREAD_ITEMS_KEY)
+    while idx != -1:
+        pos = idx + len(THREAD_ITEMS_KEY)
+        while pos < len(dataset) and dataset[pos].isspace():
+            pos += 1
+        # a real object key is not escaped inside a string and is followed by ':'
+        if dataset[idx - 1] == '\\' or pos >= len(dataset) or dataset[pos] != ':':
+            idx = dataset.find(THREAD_ITEMS_KEY, idx + 1)
+            continue
+        pos += 1
+        while pos < len(dataset) and dataset[pos].isspace():
+            pos += 1
+        value, end = JSON_DECODER.raw_decode(dataset, pos)
+        thread_items.append(value)
+        idx = dataset.find(THREAD_ITEMS_KEY, end)
+    return thread_items
+
 def remove_redundant_spaces(text: str):
     lines = text.split('\n')
     cleaned_lines = []
@@ -39,10 +108,28 @@ class Threads:
     A basic interface for interacting with Threads.
     """
     BASE_URL = "https://www.threads.net"
+    HTTP_HEADERS = {
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/134.0.0.0 Safari/537.36",
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+        "Accept-Language": "en-US,en;q=0.9",
+        "Sec-Fetch-Mode": "navigate",
+        "Sec-Fetch-Site": "none",
+        "Sec-Fetch-Dest": "document"
+    }
     def __init__(self, config: Config, logger: Logger):
         self.config = config
         self.logger = logger
         self.map_last_timestamp = {}
+        # long-lived browser shared by all scrapes, with a bounded pool of reusable pages
+        self.playwright: Playwright | None = None
+        self.browser: Browser | None = None
+        self.browser_lock = asyncio.Lock()
+        self.page_slots = asyncio.Semaphore(config.THREADS_BROWSER_POOL)
+        self.idle_pages: list[Page] = []
+        # pooled http session for the lightweight fetch mode
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=config.THREADS_CONCURRENCY, pool_maxsize=config.THREADS_CONCURRENCY))
+        self.session.headers.update(self.HTTP_HEADERS)
 
         command = [sys.executable, "-m", "playwright", "install", "chromium"]
         process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
@@ -59,27 +146,7 @@ class Threads:
 
     def parse_thread(self, data: Dict) -> Dict:
         """Parse Twitter tweet JSON dataset for the most important fields"""
-        result = jmespath.search(
-            """{
-            text: post.caption.text,
-            published_on: post.taken_at,
-            id: post.id,
-            pk: post.pk,
-            code: post.code,
-            username: post.user.username,
-            user_pic: post.user.profile_pic_url,
-            user_verified: post.user.is_verified,
-            user_pk: post.user.pk,
-            user_id: post.user.id,
-            has_audio: post.has_audio,
-            reply_count: view_replies_cta_string,
-            like_count: post.like_count,
-            images: post.image_versions2.candidates[0].url,
-            image_count: post.carousel_media_count,
-            videos: post.video_versions[].url
-        }""",
-            data,
-        )
+        result = extract_thread(data)
         result["videos"] = list(set(result["videos"] or []))
         if result["reply_count"] and type(result["reply_count"]) != int:
             result["reply_count"] = int(result["reply_count"].split(" ")[0])
@@ -88,43 +155,119 @@ class Threads:
         ] = f"{self.BASE_URL}/@{result['username']}/post/{result['code']}"
         return result
 
-    async def scrape_thread(self, url: str) -> dict:
-        """Scrape Threads post and replies from a given URL"""
+    async def get_browser(self) -> Browser:
+        async with self.browser_lock:
+            if self.browser is None or not self.browser.is_connected(): # first use or browser crashed, (re)launch it
+                if self.playwright is None:
+                    self.playwright = await async_playwright().start()
+                self.browser = await self.playwright.chromium.launch()
+            return self.browser
+
+    async def close_page(self, page: Page):
         try:
-            async with async_playwright() as pw:
-                # start Playwright browser
-                browser = await pw.chromium.launch()
+            await page.context.close()
+        except Exception:
+            pass # browser already gone
+
+    @asynccontextmanager
+    async def acquire_page(self):
+        """Borrow a page from the pool, the page is closed instead of reused when the scrape fails"""
+        async with self.page_slots:
+            page = None
+            while len(self.idle_pages) > 0 and page is None:
+                page = self.idle_pages.pop()
+                if page.is_closed() or not page.context.browser.is_connected():
+                    page = None
+            if page is None:
+                browser = await self.get_browser()
                 context = await browser.new_context(viewport={"width": 1920, "height": 1080})
                 page = await context.new_page()
+            try:
+                yield page
+            except BaseException:
+                await self.close_page(page)
+                raise
+            self.idle_pages.append(page)
+
+    async def stop(self):
+        async with self.browser_lock:
+            for page in self.idle_pages:
+                await self.close_page(page)
+            self.idle_pages.clear()
+            if self.browser is not None:
+                await self.browser.close()
+                self.browser = None
+            if self.playwright is not None:
+                await self.playwright.stop()
+                self.playwright = None
 
-                # go to url and wait for the page to load
-                await page.goto(url)
-                # wait for page to finish loading
-                await page.wait_for_selector("[data-pressable-container=true]")
-                # find all hidden datasets
-                selector = Selector(await page.content())
-                hidden_datasets = selector.css('script[type="application/json"][data-sjs]::text').getall()
-                # find datasets that contain threads data
-                for hidden_dataset in hidden_datasets:
-                    # skip loading datasets that clearly don't contain threads data
-                    if '"ScheduledServerJS"' not in hidden_dataset:
-                        continue
-                    if "thread_items" not in hidden_dataset:
-                        continue
-                    data = json.loads(hidden_dataset)
-                    # datasets are heavily nested, use nested_lookup to find 
-                    # the thread_items key for thread data
-                    thread_items = nested_lookup("thread_items", data)
-                    if not thread_items:
-                        continue
-                    # use our jmespath parser to reduce the dataset to the most important fields
-                    threads = [self.parse_thread(t) for thread in thread_items for t in thread]
-                    return {
-                        # the first parsed thread is the main post:
-                        "thread": threads[0],
-                        # other threads are replies:
-                        "replies": threads[1:],
-                    }
+    def parse_html(self, html: str) -> dict:
+        """Parse Threads post and replies from the page html, return empty dict when thread data is not found"""
+        selector = Selector(html)
+        hidden_datasets = selector.css('script[type="application/json"][data-sjs]::text').getall()
+        # find datasets that contain threads data
+        for hidden_dataset in hidden_datasets:
+            # skip loading datasets that clearly don't contain threads data
+            if '"ScheduledServerJS"' not in hidden_dataset:
+                continue
+            if "thread_items" not in hidden_dataset:
+                continue
+            try:
+                thread_items = find_thread_items(hidden_dataset)
+            except ValueError:
+                # datasets are heavily nested, use nested_lookup to find 
+                # the thread_items key for thread data
+                thread_items = nested_lookup("thread_items", json.loads(hidden_dataset))
+            if not thread_items:
+                continue
+            # reduce every thread item to the most important fields with extract_thread
+            threads = [self.parse_thread(t) for thread in thread_items for t in thread]
+            return {
+                # the first parsed thread is the main post:
+                "thread": threads[0],
+                # other threads are replies:
+                "replies": threads[1:],
+            }
+        return {}
+
+    def fetch_html(self, url: str) -> str:
+        response = self.session.get(url, timeout=self.config.THREADS_HTTP_TIMEOUT)
+        response.raise_for_status()
+        return response.text
+
+    async def scrape_thread_http(self, url: str) -> dict:
+        """Scrape Threads post and replies with a plain http request, no browser"""
+        try:
+            return self.parse_html(await asyncio.to_thread(self.fetch_html, url))
+        except Exception as err:
+            self.logger.info(Message(
+                title=f"Threads.scrape_thread_http failed, fallback to browser - url={url}",
+                body=f"Error: {err=}",
+                format=None,
+                chat_id=self.config.TELEGRAM_LOG_PEER_ID
+            ))
+            return {}
+
+    async def scrape_thread_browser(self, url: str) -> dict:
+        """Scrape Threads post and replies by rendering the page in the shared browser"""
+        async with self.acquire_page() as page:
+            # go to url and wait for the page to load
+            await page.goto(url)
+            # wait for page to finish loading
+            await page.wait_for_selector("[data-pressable-container=true]")
+            html = await page.content()
+        return self.parse_html(html)
+
+    async def scrape_thread(self, url: str) -> dict:
+        """Scrape Threads post and replies from a given URL"""
+        try:
+            if self.config.THREADS_HTTP_ENABLED:
+                response = await self.scrape_thread_http(url)
+                if "thread" in response:
+                    return response
+            response = await self.scrape_thread_browser(url)
+            if "thread" in response:
+                return response
             raise ValueError("could not find thread data in page")
         except Exception as err:
             self.logger.error(Message(
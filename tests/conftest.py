@@ -0,0 +1,17 @@
+import pytest
+
+class FakeLogger:
+    """Same interface as Logger, keeps messages instead of logging/notifying them"""
+    def __init__(self):
+        self.infos = []
+        self.errors = []
+
+    def info(self, message, notification=True):
+        self.infos.append(message)
+
+    def error(self, message, notification=True):
+        self.errors.append(message)
+
+@pytest.fixture
+def logger() -> FakeLogger:
+    return FakeLogger()
@@ -0,0 +1,134 @@
+import asyncio
+import json
+import os
+import types
+
+from command_trade.account import AccountMirror
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+def load_events() -> list[dict]:
+    with open(os.path.join(FIXTURES, "user_stream_events.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+class FakeBinanceAPI:
+    """Rest snapshot of the account before the recorded events, run waits for `gate` when it is set"""
+    def __init__(self):
+        self.gate: asyncio.Event | None = None
+        self.rest_calls = 0
+        self.symbol_configs = {}
+
+    async def run(self, func, *args, **kwargs):
+        self.rest_calls += 1
+        if self.gate is not None:
+            await self.gate.wait()
+        return func(*args, **kwargs)
+
+    def get_futures_account(self):
+        return {
+            "totalWalletBalance": "1000",
+            "assets": [{"asset": "USDT", "walletBalance": "1000"}],
+            "positions": [
+                {"symbol": "BTCUSDT", "leverage": "20", "isolated": False},
+                {"symbol": "ETHUSDT", "leverage": "5", "isolated": True}
+            ]
+        }
+
+    def get_current_position(self):
+        return [
+            {"symbol": "BTCUSDT", "positionAmt": "0", "entryPrice": "0", "markPrice": "84000", "positionInitialMargin": "0", "notional": "0"},
+            {"symbol": "ETHUSDT", "positionAmt": "0", "entryPrice": "0", "markPrice": "2000", "positionInitialMargin": "0", "notional": "0"}
+        ]
+
+    def f_open_orders(self):
+        return []
+
+    def update_symbol_config(self, symbol: str, leverage: int | None = None, margin_type: str | None = None):
+        config = self.symbol_configs.setdefault(symbol, {})
+        if leverage is not None:
+            config["leverage"] = leverage
+        if margin_type is not None:
+            config["margin_type"] = margin_type
+
+class FakePriceStream:
+    def __init__(self, mark_prices: dict):
+        self.mark_prices = mark_prices
+
+    def is_alive(self) -> bool:
+        return True
+
+    def get_mark_price(self, symbol: str) -> float | None:
+        return self.mark_prices.get(symbol)
+
+class FakeUserStream:
+    def __init__(self):
+        self.connections = 1
+        self.listeners = []
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def is_alive(self) -> bool:
+        return True
+
+def make_mirror() -> AccountMirror:
+    config = types.SimpleNamespace(BINANCE_USER_STREAM_ENABLED=True, BINANCE_ACCOUNT_RESYNC=300)
+    price_stream = FakePriceStream({"BTCUSDT": 85000.0, "ETHUSDT": 1900.0})
+    return AccountMirror(config, None, FakeBinanceAPI(), price_stream, FakeUserStream())
+
+def check_replayed(mirror: AccountMirror):
+    assert {key: (position["positionAmt"], position["entryPrice"]) for key, position in mirror.positions.items()} == {
+        ("BTCUSDT", "BOTH"): ("0.010", "84000"),
+        ("ETHUSDT", "BOTH"): ("-0.400", "2000")
+    }
+    assert sorted(mirror.orders) == [4002, 5001] # market order filled, SOLUSDT limit canceled
+    assert mirror.orders[4002]["closePosition"] is True
+    assert mirror.orders[5001]["status"] == "PARTIALLY_FILLED"
+    assert mirror.orders[5001]["executedQty"] == "0.400"
+    assert mirror.leverages == {"BTCUSDT": 20, "ETHUSDT": 10}
+    assert mirror.margin_types == {"BTCUSDT": "cross", "ETHUSDT": "isolated"}
+    assert abs(mirror.wallet_balance - 999.504) < 1e-9
+
+def test_replay_recorded_events():
+    async def replay():
+        mirror = make_mirror()
+        await mirror.resync()
+        for event in load_events():
+            await mirror.on_event(event)
+        check_replayed(mirror)
+        account_info, positions = await mirror.get_account()
+        assert mirror.binance_api.rest_calls == 3 # only the first resync
+        by_symbol = {position["symbol"]: position for position in positions}
+        assert by_symbol["BTCUSDT"]["unRealizedProfit"] == "10"
+        assert by_symbol["BTCUSDT"]["positionInitialMargin"] == "42.5"
+        assert by_symbol["ETHUSDT"]["unRealizedProfit"] == "40"
+        assert by_symbol["ETHUSDT"]["openOrderInitialMargin"] == "120"
+        assert account_info["totalWalletBalance"] == "999.504"
+        assert mirror.binance_api.symbol_configs["ETHUSDT"] == {"leverage": 10, "margin_type": "isolated"}
+    asyncio.run(replay())
+
+def test_events_during_resync_are_replayed():
+    async def replay():
+        mirror = make_mirror()
+        mirror.binance_api.gate = asyncio.Event()
+        resync = asyncio.create_task(mirror.resync())
+        await asyncio.sleep(0)
+        for event in load_events(): # received while rest api is read, the snapshot is older
+            await mirror.on_event(event)
+        mirror.binance_api.gate.set()
+        await resync
+        check_replayed(mirror)
+        assert mirror.is_fresh()
+    asyncio.run(replay())
+
+def test_cancelled_resync_stays_stale():
+    async def cancel():
+        mirror = make_mirror()
+        mirror.binance_api.gate = asyncio.Event()
+        resync = asyncio.create_task(mirror.resync())
+        await asyncio.sleep(0)
+        resync.cancel()
+        await asyncio.gather(resync, return_exceptions=True)
+        assert not mirror.is_fresh()
+        assert mirror.buffered is None
+    asyncio.run(cancel())
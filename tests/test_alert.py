@@ -0,0 +1,78 @@
+import random
+
+import pytest
+
+from command_trade.alert import AlertBook, PriceAlert
+
+def linear_triggered(alerts: list[PriceAlert], price: float) -> list[int]: # baseline: check every alert, index in insertion order
+    return [idx for idx, alert in enumerate(alerts) if alert.equal(price)]
+
+def check_consistent(book: AlertBook):
+    assert book.lower == sorted(book.lower)
+    assert book.upper == sorted(book.upper)
+    assert sorted(seq for _, seq in book.lower + book.upper) == sorted(seq for seq, _ in book.items())
+    for key, seq in book.lower + book.upper:
+        array, expected_key = book.key(book.alerts[seq])
+        assert key == expected_key
+        assert (key, seq) in array
+
+@pytest.mark.parametrize("op, price, gap, triggered, not_triggered", [
+    ("<", 100, 0.5, [100.5, 100, 99.6, 50], [100.51, 101]), # inside band above the price and anything below
+    ("<", 100, 0, [100, 99.99], [100.01]),
+    (">", 100, 0.5, [99.5, 100, 100.4, 200], [99.49, 99]), # inside band below the price and anything above
+    (">", 100, 0, [100, 100.01], [99.99]),
+])
+def test_band_edges_match_equal(op, price, gap, triggered, not_triggered):
+    for market_price in triggered + not_triggered:
+        book = AlertBook()
+        book.add(PriceAlert(op, price, gap))
+        expected = PriceAlert(op, price, gap).equal(market_price)
+        assert expected == (market_price in triggered)
+        assert (len(book.pop_triggered(market_price)) == 1) == expected
+        check_consistent(book)
+
+def test_threshold_rounding_edge_matches_equal():
+    random.seed(7)
+    for _ in range(20000):
+        alert = PriceAlert(random.choice("<>"), random.uniform(0.00001, 100000), random.choice([0, 0.1, 0.5, 1, 2.5]))
+        threshold = alert.threshold()
+        for market_price in (threshold, threshold * (1 + 1e-16), threshold * (1 - 1e-16), alert.price):
+            book = AlertBook()
+            book.add(alert)
+            assert (len(book.pop_triggered(market_price)) == 1) == alert.equal(market_price)
+            check_consistent(book)
+
+def test_randomized_against_linear_scan():
+    random.seed(42)
+    book = AlertBook()
+    alerts: list[PriceAlert] = [] # baseline list, same insertion order as book
+    for _ in range(3000):
+        action = random.random()
+        if action < 0.5:
+            alert = PriceAlert(random.choice("<>"), round(random.uniform(90, 110), 2), random.choice([0, 0.1, 0.5, 1]))
+            book.add(alert)
+            alerts.append(alert)
+        elif action < 0.7 and len(alerts) > 0:
+            list_idx = random.sample(range(len(alerts)), random.randint(1, min(3, len(alerts))))
+            book.remove_indices(list_idx + list_idx[:1]) # duplicated index is removed once
+            for idx in sorted(list_idx, reverse=True):
+                alerts.pop(idx)
+        else:
+            price = round(random.uniform(88, 112), 2)
+            expected = [alerts[idx] for idx in linear_triggered(alerts, price)]
+            assert [alert for _, alert in book.pop_triggered(price)] == expected
+            alerts = [alert for alert in alerts if not alert.equal(price)]
+        assert list(book) == alerts
+        check_consistent(book)
+
+def test_remove_indices():
+    book = AlertBook()
+    seqs = [book.add(PriceAlert(op, price)) for op, price in [("<", 10), (">", 20), ("<", 30), (">", 40)]]
+    assert book.remove_indices([2, 0]) == [seqs[2], seqs[0]] # index in insertion order, removed from the highest
+    assert [str(alert) for alert in book] == ["> 20 (0.5%)", "> 40 (0.5%)"]
+    check_consistent(book)
+    with pytest.raises(IndexError):
+        book.remove_indices([0, 5])
+    assert [str(alert) for alert in book] == ["> 20 (0.5%)", "> 40 (0.5%)"] # nothing removed on a bad index
+    check_consistent(book)
+    assert book.add(PriceAlert("<", 50)) == seqs[-1] + 1 # seq never reused
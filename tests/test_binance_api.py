@@ -0,0 +1,16 @@
+import types
+
+from command_trade.binance_api import BinanceAPI, USER_TRADES_LIMIT
+
+def test_user_trades_paginates_by_trade_id():
+    all_trades = [{"id": 100 + index, "orderId": index // 3, "time": 1744000000000 + index} for index in range(2 * USER_TRADES_LIMIT + 5)]
+    calls = []
+    def futures_account_trades(symbol, limit, startTime=None, fromId=None):
+        calls.append((startTime, fromId))
+        assert startTime is None or fromId is None
+        first = 0 if fromId is None else fromId - 100
+        return all_trades[first:first + limit]
+    binance_api = BinanceAPI.__new__(BinanceAPI) # only the rest client is used
+    binance_api.binance_client = types.SimpleNamespace(futures_account_trades=futures_account_trades)
+    assert binance_api.f_user_trades("BTCUSDT", 1744000000000) == all_trades
+    assert calls == [(1744000000000, None), (None, 100 + USER_TRADES_LIMIT), (None, 100 + 2 * USER_TRADES_LIMIT)]
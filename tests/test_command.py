@@ -0,0 +1,72 @@
+import asyncio
+import types
+
+from command_trade.command import Command
+
+class FakeAccountMirror:
+    """BTCUSDT has a position and a stop order, ETHUSDT only has an open limit order"""
+    def __init__(self):
+        self.orders = {
+            1: {"orderId": 1, "symbol": "BTCUSDT", "type": "STOP_MARKET", "reduceOnly": True},
+            2: {"orderId": 2, "symbol": "ETHUSDT", "type": "LIMIT", "reduceOnly": False}
+        }
+
+    async def get_positions(self, symbol: str | None = None) -> list[dict]:
+        positions = [{"symbol": "BTCUSDT", "positionAmt": "-0.010"}, {"symbol": "ETHUSDT", "positionAmt": "0"}]
+        return [position for position in positions if symbol is None or position["symbol"] == symbol]
+
+class FakeBinanceAPI:
+    def __init__(self):
+        self.cancelled = []
+        self.batches = []
+
+    async def run(self, func, *args):
+        return func(*args)
+
+    def f_cancel_all_open_orders(self, symbol: str):
+        self.cancelled.append(symbol)
+        return {"code": 200, "msg": "The operation of cancel all open order is done."}
+
+    def f_batch_order(self, batch_orders: list[dict]):
+        self.batches.append(batch_orders)
+        return [{"orderId": 100 + index} for index in range(len(batch_orders))]
+
+def make_command(logger) -> Command:
+    command = Command.__new__(Command) # only the fclose path is used
+    command.config = types.SimpleNamespace(TELEGRAM_LOG_PEER_ID=0)
+    command.logger = logger
+    command.account_mirror = FakeAccountMirror()
+    command.binance_api = FakeBinanceAPI()
+    command.background_tasks = set()
+    command.replied_pnl = []
+    async def f_reply_pnl(update, symbol, list_order_id, start_time):
+        command.replied_pnl.append((symbol, list_order_id))
+    command.f_reply_pnl = f_reply_pnl
+    return command
+
+def make_update() -> types.SimpleNamespace:
+    replies = []
+    async def reply_text(text, **kwargs):
+        replies.append(text)
+    return types.SimpleNamespace(message=types.SimpleNamespace(reply_text=reply_text, replies=replies))
+
+def test_fclose_all_cancels_orders_of_symbols_without_position(logger):
+    async def run():
+        command = make_command(logger)
+        update = make_update()
+        await command.fclose(update, types.SimpleNamespace(args=["all"]))
+        await asyncio.gather(*command.background_tasks)
+        assert command.binance_api.cancelled == ["BTCUSDT", "ETHUSDT"]
+        assert command.binance_api.batches == [[{"type": "MARKET", "side": "BUY", "symbol": "BTCUSDT", "quantity": "0.010", "reduceOnly": "true", "order_id": 100}]]
+        assert "Cancel all open orders for ETHUSDT" in update.message.replies[0]
+        assert command.replied_pnl == [("BTCUSDT", [100])]
+        assert logger.errors == []
+    asyncio.run(run())
+
+def test_fclose_symbols_only_cancels_requested(logger):
+    async def run():
+        command = make_command(logger)
+        await command.fclose(make_update(), types.SimpleNamespace(args=["btc"]))
+        assert command.binance_api.cancelled == ["BTCUSDT"]
+        assert logger.errors == []
+    asyncio.run(run())
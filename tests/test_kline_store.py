@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from command_trade import kline_store
+from command_trade.kline_store import KlineStore
+
+MINUTE = 60_000
+ROW_BYTES = KlineStore.COLUMNS * 8
+
+class FakeClock:
+    def __init__(self, now_ms: int):
+        self.now_ms = now_ms
+
+    def time(self) -> float:
+        return self.now_ms / 1000
+
+class FakeFetch:
+    """1m klines up to the clock, same row layout as futures_historical_klines"""
+    def __init__(self, clock: FakeClock):
+        self.clock = clock
+        self.calls = []
+
+    def __call__(self, symbol: str, interval: str, start_ms: int) -> list:
+        self.calls.append((symbol, interval, start_ms))
+        open_time = -(-start_ms // MINUTE) * MINUTE
+        klines = []
+        while open_time <= self.clock.now_ms:
+            price = str(open_time // MINUTE)
+            klines.append([open_time, price, price, price, price, "1.5", open_time + MINUTE - 1, "0", 1, "0", "0", "0"])
+            open_time += MINUTE
+        return klines
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    clock = FakeClock(1000 * MINUTE + MINUTE // 2) # in the middle of an open candle
+    monkeypatch.setattr(kline_store.time, "time", clock.time)
+    return clock
+
+def test_repeated_request_fetches_only_the_tail(clock):
+    fetch = FakeFetch(clock)
+    store = KlineStore(fetch, max_bytes=1 << 20)
+    candles = store.get("BTCUSDT", "1m", clock.now_ms - 100 * MINUTE)
+    assert len(candles) == 100 and candles[-1, 0] == 1000 * MINUTE # open candle is returned
+    assert len(store.buffers["BTCUSDT", "1m"]) == 99 # but never kept
+
+    clock.now_ms += 5 * MINUTE
+    again = store.get("BTCUSDT", "1m", clock.now_ms - 100 * MINUTE)
+    assert fetch.calls[-1] == ("BTCUSDT", "1m", 1000 * MINUTE) # right after the last closed candle
+    expected = np.asarray(FakeFetch(clock)("BTCUSDT", "1m", clock.now_ms - 100 * MINUTE))[:, :KlineStore.COLUMNS].astype(np.float64)
+    assert np.array_equal(again, expected)
+    assert np.all(np.diff(again[:, 0]) == MINUTE) # no gap or duplicate at the join
+
+def test_buffer_is_trimmed_to_largest_requested_window(clock):
+    store = KlineStore(FakeFetch(clock), max_bytes=1 << 20)
+    store.get("BTCUSDT", "1m", clock.now_ms - 100 * MINUTE)
+    store.get("BTCUSDT", "1m", clock.now_ms - 10 * MINUTE) # smaller window is served from the same buffer
+    for _ in range(500):
+        clock.now_ms += MINUTE
+        store.get("BTCUSDT", "1m", clock.now_ms - 100 * MINUTE)
+    buffer = store.buffers["BTCUSDT", "1m"]
+    assert len(buffer) == 99 # does not grow with the uptime
+    assert buffer[0, 0] >= clock.now_ms - 100 * MINUTE
+    assert store.nbytes == buffer.nbytes
+
+def test_lru_eviction_by_byte_budget(clock):
+    store = KlineStore(FakeFetch(clock), max_bytes=250 * ROW_BYTES)
+    store.get("BTCUSDT", "1m", clock.now_ms - 100 * MINUTE)
+    store.get("ETHUSDT", "1m", clock.now_ms - 100 * MINUTE)
+    store.get("BTCUSDT", "1m", clock.now_ms - 100 * MINUTE) # BTCUSDT is now the most recently used
+    store.get("SOLUSDT", "1m", clock.now_ms - 100 * MINUTE)
+    assert list(store.buffers) == [("BTCUSDT", "1m"), ("SOLUSDT", "1m")]
+    assert store.nbytes == sum(buffer.nbytes for buffer in store.buffers.values()) <= store.max_bytes
+    assert set(store.windows) == set(store.buffers)
+
+def test_oversized_key_replaces_stale_buffer(clock):
+    fetch = FakeFetch(clock)
+    store = KlineStore(fetch, max_bytes=150 * ROW_BYTES)
+    store.get("BTCUSDT", "1m", clock.now_ms - 100 * MINUTE)
+    assert ("BTCUSDT", "1m") in store.buffers
+    candles = store.get("BTCUSDT", "1m", clock.now_ms - 500 * MINUTE) # over the whole budget
+    assert len(candles) == 500
+    assert ("BTCUSDT", "1m") not in store.buffers and store.nbytes == 0
+    clock.now_ms += MINUTE
+    candles = store.get("BTCUSDT", "1m", clock.now_ms - 100 * MINUTE) # not served from the old buffer
+    assert fetch.calls[-1] == ("BTCUSDT", "1m", clock.now_ms - 100 * MINUTE)
+    assert candles[-1, 0] == 1001 * MINUTE
+    assert len(store.buffers["BTCUSDT", "1m"]) == 99
@@ -0,0 +1,35 @@
+import re
+from collections import Counter
+
+from command_trade.notification import Message, NotificationHandler, TELEGRAM_MESSAGE_LIMIT
+
+def make_handler() -> NotificationHandler:
+    return NotificationHandler.__new__(NotificationHandler) # coalesce needs no telegram bot
+
+def error(index: int) -> Message:
+    return Message(title=f"Error BinanceAPI.f_price_{index}", body=f"Error: err=APIError(code=-1003): Too many requests [{index}], retry_after=1.5", chat_id=1)
+
+def test_coalesce_stays_under_limit_with_counts():
+    handler = make_handler()
+    messages = [error(index) for index in range(43) for _ in range(12)]
+    coalesced = handler.coalesce(messages)
+    assert len(coalesced) > 1
+    assert all(handler.text_length(message) <= TELEGRAM_MESSAGE_LIMIT for message in coalesced)
+    counts = Counter()
+    for message in coalesced: # a run of duplicates may be split between two messages at the limit
+        for title, count in re.findall(r"^\*\*(.+?)\*\*(?: \(x(\d+)\))?$", message.body, re.MULTILINE):
+            counts[title] += int(count or 1)
+    assert counts == {message.title: 12 for message in messages}
+
+def test_coalesce_collapses_only_adjacent_duplicates():
+    handler = make_handler()
+    a, b = error(1), error(2)
+    coalesced = handler.coalesce([a, a, b, a])
+    assert len(coalesced) == 1
+    assert coalesced[0].body == f"**{a.title}** (x2)\n{a.body}\n\n**{b.title}**\n{b.body}\n\n**{a.title}**\n{a.body}"
+
+def test_coalesce_keeps_single_message_and_other_chats():
+    handler = make_handler()
+    a = error(1)
+    other = Message(title="Alert", body="BTCUSDT > 100000", chat_id=2)
+    assert handler.coalesce([a, other]) == [a, other]
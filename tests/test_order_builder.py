@@ -0,0 +1,92 @@
+import asyncio
+import types
+from decimal import Decimal
+
+import pytest
+
+from command_trade.command import Command
+from command_trade.order_builder import OrderBuilder, SymbolRules
+
+BTC_INFO = {
+    "symbol": "BTCUSDT", "pricePrecision": 2, "quantityPrecision": 3,
+    "filters": [
+        {"filterType": "PRICE_FILTER", "tickSize": "0.10"},
+        {"filterType": "LOT_SIZE", "stepSize": "0.001", "minQty": "0.001", "maxQty": "1000"},
+        {"filterType": "MARKET_LOT_SIZE", "stepSize": "0.001", "minQty": "0.001", "maxQty": "120"},
+        {"filterType": "MIN_NOTIONAL", "notional": "100"}
+    ]
+}
+
+def test_quantity_is_floored_to_step():
+    rules = SymbolRules(BTC_INFO)
+    assert rules.quantity(100, 10, Decimal("85000")) == "0.011" # 0.01176... never more margin than asked
+    assert rules.price("85000.06") == "85000.1"
+    assert rules.price(Decimal("84999.94")) == "84999.9"
+
+@pytest.mark.parametrize("margin, leverage, price, message", [
+    (1, 1, "85000", "less than min quantity"),
+    (50, 2, "90000", "less than min notional"), # 0.001 * 90000 is under min notional 100
+    (1_000_000, 125, "85000", "greater than max quantity"),
+])
+def test_quantity_filters(margin, leverage, price, message):
+    with pytest.raises(ValueError, match=message):
+        SymbolRules(BTC_INFO).quantity(margin, leverage, Decimal(price))
+
+@pytest.mark.parametrize("price, message", [
+    ("abc", "BTCUSDT: price 'abc' is not a number"),
+    ("1,5", "BTCUSDT: price '1,5' is not a number"),
+    ("", "BTCUSDT: price '' is not a number"),
+    ("nan", "BTCUSDT: price 'nan' must be a positive number"),
+    ("-5", "BTCUSDT: price '-5' must be a positive number"),
+    ("0", "BTCUSDT: price '0' must be a positive number"),
+])
+def test_bad_price_is_value_error(price, message):
+    rules = SymbolRules(BTC_INFO)
+    with pytest.raises(ValueError) as err:
+        rules.price(price)
+    assert str(err.value) == message
+    with pytest.raises(ValueError):
+        rules.quantity(100, 10, price, market=False)
+
+def test_bad_margin_is_value_error():
+    with pytest.raises(ValueError, match="margin nan must be a positive number"):
+        SymbolRules(BTC_INFO).quantity(float("nan"), 10, Decimal("85000"))
+
+def make_command(logger) -> Command:
+    command = Command.__new__(Command) # only the order building path is used
+    command.config = types.SimpleNamespace(TELEGRAM_LOG_PEER_ID=0)
+    command.logger = logger
+    price_stream = types.SimpleNamespace(get_fresh_ticker=lambda symbol: {"lastPrice": "85000"})
+    command.batches = []
+    async def run(func, *args):
+        return func(*args)
+    command.binance_api = types.SimpleNamespace(run=run, f_batch_order=lambda batch_orders: command.batches.append(batch_orders) or [{"orderId": 1}] * len(batch_orders))
+    command.order_builder = OrderBuilder(command.binance_api, price_stream)
+    async def f_set_leverage_and_margin_type(symbol, leverage):
+        pass
+    async def f_get_symbol_rules(symbol):
+        return SymbolRules(BTC_INFO)
+    command.f_set_leverage_and_margin_type = f_set_leverage_and_margin_type
+    command.f_get_symbol_rules = f_get_symbol_rules
+    return command
+
+def make_update() -> types.SimpleNamespace:
+    replies = []
+    async def reply_text(text, **kwargs):
+        replies.append(text)
+    return types.SimpleNamespace(message=types.SimpleNamespace(reply_text=reply_text, replies=replies))
+
+@pytest.mark.parametrize("handler, args", [
+    ("forder", ["buy", "btc", "10", "100", "80k"]), # bad stop loss
+    ("forder", ["buy", "btc", "10", "100", "80000", "9O000"]), # bad take profit
+    ("flimit", ["buy", "btc", "10", "100", "84,000"]),
+])
+def test_bad_price_replies_not_sent(logger, handler, args):
+    async def run():
+        command = make_command(logger)
+        update = make_update()
+        await getattr(command, handler)(update, types.SimpleNamespace(args=args))
+        assert command.batches == []
+        assert len(update.message.replies) == 1 and "is not sent" in update.message.replies[0] and "is not a number" in update.message.replies[0]
+        assert logger.errors == []
+    asyncio.run(run())
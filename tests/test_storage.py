@@ -0,0 +1,147 @@
+import sqlite3
+import time
+import types
+from collections import defaultdict
+
+from command_trade.alert import AlertBook
+from command_trade.command import Command, ThreadsReply, JOB_NAME_FALERT_TRACK, JOB_NAME_FSTATS
+from command_trade.storage import Storage
+
+def make_config(path, flush_interval: float = 0.05):
+    return types.SimpleNamespace(STORAGE_PATH=str(path), STORAGE_FLUSH_INTERVAL=flush_interval, TELEGRAM_LOG_PEER_ID=0, THREADS_SEEN_LIMIT=1000)
+
+def rows(path, sql: str) -> list:
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+def make_reply(url: str, replies: list[tuple[str, int]]) -> ThreadsReply:
+    threads_reply = ThreadsReply(url, 1744000000)
+    for pk, published_on in replies:
+        threads_reply.mark_seen(pk, published_on)
+    return threads_reply
+
+def test_wal_and_nested_path(tmp_path, logger):
+    path = tmp_path / "data" / "nested" / "command_trade.db"
+    storage = Storage(make_config(path), logger)
+    assert rows(path, "PRAGMA journal_mode") == [("wal",)]
+    storage.close()
+
+def test_round_trip_after_restart(tmp_path, logger):
+    path = tmp_path / "command_trade.db"
+    storage = Storage(make_config(path), logger)
+    storage.put_alert("BTCUSDT", 0, "<", 80000.0, 0.5)
+    storage.put_alert("BTCUSDT", 1, ">", 90000.0, 1.0)
+    storage.put_alert("ETHUSDT", 0, ">", 2000.0, 0.5)
+    storage.put_alert("BTCUSDT", 1, ">", 95000.0, 1.0) # replaced
+    storage.delete_alert("ETHUSDT", 0)
+    storage.put_reply("m1", make_reply("https://www.threads.net/@a/post/1", [("11", 1744000100), ("12", 1744000200)]))
+    storage.put_reply("m2", make_reply("https://www.threads.net/@b/post/2", []))
+    storage.delete_replies("m2")
+    storage.put_job(JOB_NAME_FSTATS, 60)
+    storage.put_job(JOB_NAME_FALERT_TRACK, 5)
+    storage.delete_job(JOB_NAME_FSTATS)
+    storage.close()
+
+    storage = Storage(make_config(path), logger) # restart
+    assert storage.load_alerts() == [("BTCUSDT", 0, "<", 80000.0, 0.5), ("BTCUSDT", 1, ">", 95000.0, 1.0)]
+    (message_id, url, max_timestamp, min_timestamp, seen), = storage.load_replies()
+    assert (message_id, url, max_timestamp, min_timestamp) == ("m1", "https://www.threads.net/@a/post/1", 1744000200, 1744000000)
+    restored = ThreadsReply(url, min_timestamp)
+    restored.load_seen(seen)
+    assert not restored.is_new("11", 1744000100) and restored.is_new("13", 1744000300)
+    assert storage.load_jobs() == {JOB_NAME_FALERT_TRACK: 5}
+    storage.delete_alerts()
+    storage.delete_replies()
+    storage.close()
+    assert rows(path, "SELECT COUNT(*) FROM alerts") == [(0,)]
+    assert rows(path, "SELECT COUNT(*) FROM replies") == [(0,)]
+    assert logger.errors == []
+
+def test_writes_are_batched_and_flushed_on_close(tmp_path, logger):
+    path = tmp_path / "command_trade.db"
+    storage = Storage(make_config(path, flush_interval=5), logger)
+    for seq in range(Storage.MAX_BATCH + 10): # a full batch is committed without waiting for the interval
+        storage.put_alert("BTCUSDT", seq, "<", 1.0 + seq, 0.5)
+    deadline = time.time() + 2
+    while rows(path, "SELECT COUNT(*) FROM alerts") != [(Storage.MAX_BATCH,)]:
+        assert time.time() < deadline
+        time.sleep(0.01)
+    started = time.time()
+    assert rows(path, "SELECT COUNT(*) FROM alerts") == [(Storage.MAX_BATCH,)] # the rest waits for the interval
+    storage.close() # flushes the rest without waiting for the interval
+    assert time.time() - started < 2
+    assert rows(path, "SELECT COUNT(*) FROM alerts") == [(Storage.MAX_BATCH + 10,)]
+
+def test_failed_write_is_logged_and_writer_continues(tmp_path, logger):
+    path = tmp_path / "command_trade.db"
+    storage = Storage(make_config(path), logger)
+    storage.execute("INSERT INTO missing_table VALUES (1)")
+    storage.queue.join()
+    storage.put_job(JOB_NAME_FSTATS, 60)
+    storage.close()
+    assert len(logger.errors) == 1 and logger.errors[0].title.startswith("Error Storage.process_queue")
+    assert rows(path, "SELECT name, interval FROM jobs") == [(JOB_NAME_FSTATS, 60)]
+
+def test_migrate_replies_without_seen(tmp_path, logger):
+    path = tmp_path / "command_trade.db"
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute("CREATE TABLE replies (message_id TEXT PRIMARY KEY, url TEXT, max_timestamp INTEGER)")
+        conn.execute("INSERT INTO replies VALUES ('m1', 'https://www.threads.net/@a/post/1', 1744000000)")
+    conn.close()
+    storage = Storage(make_config(path), logger)
+    assert storage.load_replies() == [("m1", "https://www.threads.net/@a/post/1", 1744000000, 1744000000, "[]")]
+    storage.close()
+
+class FakeJobQueue:
+    def __init__(self):
+        self.jobs = {}
+
+    def run_repeating(self, callback, interval, first, name):
+        self.jobs[name] = interval
+
+def make_command(storage, logger) -> Command:
+    command = Command.__new__(Command) # only the restore path is used
+    command.config = storage.config
+    command.logger = logger
+    command.storage = storage
+    command.map_alert_price = defaultdict(AlertBook)
+    command.map_tracking_replies = defaultdict(ThreadsReply)
+    command.alert_tracking = False
+    return command
+
+def test_restore_into_command(tmp_path, logger):
+    path = tmp_path / "command_trade.db"
+    storage = Storage(make_config(path), logger)
+    storage.put_alert("BTCUSDT", 3, "<", 80000.0, 0.5)
+    storage.put_reply("m1", make_reply("https://www.threads.net/@a/post/1", [("11", 1744000100)]))
+    storage.put_job(JOB_NAME_FALERT_TRACK, 5)
+    storage.execute("INSERT INTO alerts (symbol, seq, op, price, gap) VALUES ('ETHUSDT', 0, '<', 'abc', 0.5)") # bad row
+    storage.close()
+
+    storage = Storage(make_config(path), logger)
+    command = make_command(storage, logger)
+    job_queue = FakeJobQueue()
+    command.f_restore(types.SimpleNamespace(job_queue=job_queue))
+    storage.close()
+    assert [str(alert) for alert in command.map_alert_price["BTCUSDT"]] == ["< 80000.0 (0.5%)"]
+    assert command.map_alert_price["BTCUSDT"].next_seq == 4
+    assert "ETHUSDT" not in command.map_alert_price or len(command.map_alert_price["ETHUSDT"]) == 0
+    assert not command.map_tracking_replies["m1"].is_new("11", 1744000100)
+    assert job_queue.jobs == {JOB_NAME_FALERT_TRACK: 5}
+    assert command.alert_tracking
+    assert [message.title for message in logger.errors] == ["Error Command.f_restore - 1 rows skipped"]
+
+def test_restore_from_corrupt_db_starts_empty(tmp_path, logger):
+    path = tmp_path / "command_trade.db"
+    storage = Storage(make_config(path), logger)
+    storage.close()
+    with open(path, "r+b") as f: # overwrite the sqlite header
+        f.write(b"not a sqlite database at all" * 4)
+    command = make_command(storage, logger)
+    command.f_restore(types.SimpleNamespace(job_queue=FakeJobQueue()))
+    assert len(command.map_alert_price) == 0
+    assert logger.errors[0].title == "Error Command.f_restore - storage is not readable, start without restored state"
@@ -0,0 +1,162 @@
+import asyncio
+import json
+import time
+import types
+from collections import defaultdict
+
+import websockets
+
+from command_trade.alert import AlertBook, PriceAlert
+from command_trade.command import Command
+from command_trade.stream import PriceStream
+
+def make_config(url: str = "ws://127.0.0.1:1", max_age: float = 10):
+    return types.SimpleNamespace(BINANCE_STREAM_URL=url, BINANCE_STREAM_MAX_AGE=max_age, TELEGRAM_LOG_PEER_ID=0, TELEGRAM_ALERT_CHAT_ID=42, TELEGRAM_ME="@me")
+
+def ticker_event(symbol: str, price: str) -> dict: # !ticker@arr item, same fields as binance
+    return {"e": "24hrTicker", "E": 1744000000000, "s": symbol, "p": "-10.5", "P": "-1.2", "w": "850", "c": price, "Q": "0.1",
+            "o": "860", "h": "870", "l": "840", "v": "1000", "q": "850000", "O": 1743913600000, "C": 1744000000000, "F": 1, "L": 2, "n": 2}
+
+def ticker_frame(*tickers: tuple[str, str]) -> str:
+    return json.dumps({"stream": "!ticker@arr", "data": [ticker_event(symbol, price) for symbol, price in tickers]})
+
+def mark_price_frame(symbol: str, price: str) -> str:
+    return json.dumps({"stream": "!markPrice@arr@1s", "data": [{"e": "markPriceUpdate", "E": 1744000000000, "s": symbol, "p": price, "i": price, "P": price, "r": "0.0001", "T": 1744003600000}]})
+
+async def wait_for(condition, timeout: float = 5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "condition not reached"
+        await asyncio.sleep(0.01)
+
+def test_ticker_and_mark_price_mapping(logger):
+    async def run():
+        async def handler(ws):
+            assert ws.request.path == "/stream?streams=!ticker@arr/!markPrice@arr@1s"
+            await ws.send(ticker_frame(("BTCUSDT", "85000.1"), ("ETHUSDT", "1900")))
+            await ws.send(mark_price_frame("BTCUSDT", "85001.5"))
+            await ws.wait_closed() # until the stream is stopped
+        async with websockets.serve(handler, "127.0.0.1", 0) as server:
+            stream = PriceStream(make_config(f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}"), logger)
+            stream.start()
+            await wait_for(lambda: stream.get_mark_price("BTCUSDT") is not None)
+            assert stream.get_ticker("BTCUSDT") == {
+                "symbol": "BTCUSDT", "priceChange": "-10.5", "priceChangePercent": "-1.2", "lastPrice": "85000.1", "openPrice": "860",
+                "highPrice": "870", "lowPrice": "840", "volume": "1000", "quoteVolume": "850000", "closeTime": 1744000000000
+            }
+            assert stream.get_ticker("ETHUSDT")["lastPrice"] == "1900"
+            assert stream.get_mark_price("BTCUSDT") == 85001.5
+            assert stream.get_ticker("SOLUSDT") is None
+            await stream.stop()
+            assert not stream.connected
+    asyncio.run(run())
+
+def test_slow_listener_gets_coalesced_updates(logger):
+    async def run():
+        async def handler(ws):
+            for index in range(60):
+                await ws.send(ticker_frame((f"S{index % 3}USDT", str(index))))
+                await asyncio.sleep(0.005)
+            await ws.wait_closed() # until the stream is stopped
+        received = []
+        async def slow_listener(tickers: dict):
+            received.append({symbol: ticker["lastPrice"] for symbol, ticker in tickers.items()})
+            await asyncio.sleep(0.1)
+        async with websockets.serve(handler, "127.0.0.1", 0) as server:
+            stream = PriceStream(make_config(f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}"), logger)
+            stream.add_listener(slow_listener)
+            stream.start()
+            # read loop is never blocked by the listener: all frames are read long before the listener could handle them one by one
+            await wait_for(lambda: stream.tickers.get("S2USDT", {}).get("lastPrice") == "59", timeout=2)
+            await wait_for(lambda: received and received[-1].get("S2USDT") == "59")
+            await stream.stop()
+        assert len(received) < 20
+        last_seen = {}
+        for update in received:
+            last_seen.update(update)
+        assert last_seen == {"S0USDT": "57", "S1USDT": "58", "S2USDT": "59"}
+    asyncio.run(run())
+
+def test_fresh_ticker_per_symbol(logger):
+    async def run():
+        stream = PriceStream(make_config(max_age=10), logger)
+        stream.connected = True
+        stream.last_message_at = time.time()
+        await stream.on_message(json.loads(ticker_frame(("BTCUSDT", "85000"), ("THINUSDT", "0.01"))))
+        stream.received_at["THINUSDT"] -= 60 # not updated by !ticker@arr for a minute
+        assert stream.get_fresh_ticker("BTCUSDT")["lastPrice"] == "85000"
+        assert stream.get_fresh_ticker("THINUSDT") is None
+        assert stream.get_ticker("THINUSDT")["lastPrice"] == "0.01"
+        stream.last_message_at -= 60 # whole stream is stale
+        assert stream.get_fresh_ticker("BTCUSDT") is None
+    asyncio.run(run())
+
+def test_reconnect_after_close_and_backoff_on_errors(logger):
+    async def run():
+        connections = []
+        async def handler(ws):
+            connections.append(time.time())
+            await ws.send(ticker_frame(("BTCUSDT", str(len(connections)))))
+            # closed by server right after the first frame
+        async with websockets.serve(handler, "127.0.0.1", 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            stream = PriceStream(make_config(f"ws://127.0.0.1:{port}"), logger)
+            stream.start()
+            await wait_for(lambda: len(connections) >= 2)
+            assert stream.tickers["BTCUSDT"]["lastPrice"] in ("1", "2")
+            assert 0.9 <= connections[1] - connections[0] < 2 # backoff is reset after a successful connection
+            await stream.stop()
+        # nothing listens on the port any more, backoff doubles on each failed connection
+        stream = PriceStream(make_config(f"ws://127.0.0.1:{port}"), logger)
+        stream.start()
+        await wait_for(lambda: len(logger.errors) >= 2)
+        await stream.stop()
+        assert [message.title for message in logger.errors[:2]] == ["Error PriceStream.run, reconnect after 1s", "Error PriceStream.run, reconnect after 2s"]
+    asyncio.run(run())
+
+class FakeBot:
+    def __init__(self):
+        self.messages = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.messages.append((chat_id, text))
+
+def make_command(config, bot: FakeBot) -> Command:
+    command = Command.__new__(Command) # only the alert path is used
+    command.config = config
+    command.application = types.SimpleNamespace(bot=bot)
+    command.map_alert_price = defaultdict(AlertBook)
+    command.alert_lock = asyncio.Lock()
+    command.alert_tracking = True
+    command.storage = types.SimpleNamespace(deleted=[])
+    command.storage.delete_alert = lambda symbol, seq: command.storage.deleted.append((symbol, seq))
+    async def run(func, *args):
+        return func(*args)
+    command.binance_api = types.SimpleNamespace(run=run, f_get_symbol_info=lambda symbol: {"pricePrecision": 2})
+    return command
+
+def test_price_update_triggers_alerts(logger):
+    async def run():
+        async def handler(ws):
+            await ws.send(ticker_frame(("BTCUSDT", "84990"), ("ETHUSDT", "1900")))
+            await ws.wait_closed() # until the stream is stopped
+        bot = FakeBot()
+        async with websockets.serve(handler, "127.0.0.1", 0) as server:
+            config = make_config(f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}")
+            command = make_command(config, bot)
+            command.map_alert_price["BTCUSDT"].add(PriceAlert("<", 85000, 0))
+            command.map_alert_price["BTCUSDT"].add(PriceAlert("<", 80000, 0))
+            command.map_alert_price["ETHUSDT"].add(PriceAlert(">", 2000, 0))
+            stream = PriceStream(config, logger)
+            stream.add_listener(command.on_price_update)
+            stream.start()
+            await wait_for(lambda: len(bot.messages) == 1)
+            await stream.stop()
+        chat_id, text = bot.messages[0]
+        assert chat_id == 42
+        assert "BTCUSDT" in text and "85000" in text and "ETHUSDT" not in text
+        assert command.storage.deleted == [("BTCUSDT", 0)]
+        assert [str(alert) for alert in command.map_alert_price["BTCUSDT"]] == ["< 80000 (0%)"]
+        assert len(command.map_alert_price["ETHUSDT"]) == 1
+        assert logger.errors == []
+    asyncio.run(run())
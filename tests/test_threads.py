@@ -0,0 +1,39 @@
+import os
+
+from command_trade.threads import Threads
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+def read_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+def make_threads() -> Threads:
+    return Threads.__new__(Threads) # parse_html needs no browser, skip playwright install in __init__
+
+def test_parse_html_post_and_replies():
+    result = make_threads().parse_html(read_fixture("threads_post.html"))
+    thread = result["thread"]
+    assert thread["code"] == "DIxYz1aT0kQ"
+    assert thread["username"] == "binance_vn"
+    assert thread["user_verified"] is True
+    assert thread["text"] == 'BTC vượt 100k, "thread_items" đang hot 🚀'
+    assert thread["published_on"] == 1744000000
+    assert thread["reply_count"] == 12
+    assert thread["like_count"] == 1520
+    assert thread["images"] == "https://scontent.cdninstagram.com/v/t51.2885-15/main_1.jpg"
+    assert thread["image_count"] == 2
+    assert thread["videos"] == []
+    assert thread["url"] == "https://www.threads.net/@binance_vn/post/DIxYz1aT0kQ"
+
+    assert [reply["code"] for reply in result["replies"]] == ["DIxZa2bU1lR", "DIxZb3cV2mS"]
+    first, second = result["replies"]
+    assert first["reply_count"] is None
+    assert first["images"] is None
+    assert second["reply_count"] == 1
+    assert second["videos"] == ["https://scontent.cdninstagram.com/o1/v/t16/f2/m69/clip.mp4"] # duplicates removed
+    assert second["has_audio"] is True
+
+def test_parse_html_without_thread_data():
+    html = '<html><head><script type="application/json" data-sjs>{"require": [["ScheduledServerJS", "handle", null, []]]}</script></head></html>'
+    assert make_threads().parse_html(html) == {}